@@ -0,0 +1,107 @@
+import os
+import time
+import logging
+import importlib
+import threading
+from typing import Any, Callable, Dict, List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Backends loaded in the background at startup, comma separated (e.g. "sentiment,predictor");
+# everything else loads on first use. SENTIMENT_WARMUP=1 is still honoured as "sentiment".
+WARM_BACKENDS = [
+    name.strip()
+    for name in os.getenv("WARM_BACKENDS", "sentiment" if os.getenv("SENTIMENT_WARMUP") == "1" else "").split(',')
+    if name.strip()
+]
+
+class BackendRegistry:
+    """
+    Named heavy dependencies (ML frameworks, models) loaded on first use.
+
+    Each backend is a loader returning the object callers work with. It runs at
+    most once, under a per-backend lock, and its outcome and load time are kept for
+    the readiness report. A failed load is retried on the next get().
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._descriptions: Dict[str, str] = {}
+        self._loaded: Dict[str, Any] = {}
+        self._status: Dict[str, Dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any], description: str = ""):
+        self._loaders[name] = loader
+        self._descriptions[name] = description
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "cold"}
+
+    def names(self) -> List[str]:
+        return list(self._loaders)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def get(self, name: str) -> Any:
+        if name in self._loaded:
+            return self._loaded[name]
+        if name not in self._loaders:
+            raise KeyError(f"Unknown backend: {name}")
+        with self._locks[name]:
+            if name not in self._loaded:
+                self._status[name] = {"state": "loading"}
+                started = time.monotonic()
+                try:
+                    value = self._loaders[name]()
+                except Exception as e:
+                    self._status[name] = {"state": "failed", "error": str(e)}
+                    logger.error(f"Failed to load backend {name}: {str(e)}")
+                    raise
+                elapsed = round(time.monotonic() - started, 2)
+                self._loaded[name] = value
+                self._status[name] = {"state": "warm", "load_seconds": elapsed}
+                logger.info(f"Loaded backend {name} in {elapsed}s")
+        return self._loaded[name]
+
+    def warm(self, names: List[str]):
+        """Load the given backends, logging rather than raising failures."""
+        for name in names:
+            try:
+                self.get(name)
+            except KeyError as e:
+                logger.error(e.args[0])
+            except Exception:
+                pass  # get() already logged it
+
+    def status(self) -> Dict[str, Dict]:
+        return {name: {"description": self._descriptions[name], **self._status[name]} for name in self._loaders}
+
+def _load_predictor():
+    predictor = importlib.import_module(".predictor", __package__)
+    # Import the ensemble frameworks now so the first fit doesn't pay for them
+    import statsmodels.tsa.arima.model  # noqa: F401
+    import prophet  # noqa: F401
+    import xgboost  # noqa: F401
+    import keras  # noqa: F401
+    return predictor
+
+def _load_sentiment():
+    sentiment = importlib.import_module(".utils.sentiment", __package__)
+    sentiment.sentiment_scorer.warm_up()
+    return sentiment
+
+def _load_shap():
+    import shap
+    return shap
+
+backends = BackendRegistry()
+backends.register("predictor", _load_predictor, "Hybrid ensemble: statsmodels, Prophet, XGBoost, Keras")
+backends.register("sentiment", _load_sentiment, "Transformer news sentiment model")
+backends.register("shap", _load_shap, "SHAP explainers for fitted models")
+
+# A misspelt name would otherwise keep /ready at 503 forever
+_unknown = sorted(set(WARM_BACKENDS) - set(backends.names()))
+if _unknown:
+    raise ValueError(f"Unknown backends in WARM_BACKENDS: {', '.join(_unknown)} (known: {', '.join(backends.names())})")
@@ -0,0 +1,285 @@
+"""
+Offline walk-forward backtest and benchmark of the forecasting models.
+
+Replays OHLCV history from local fixture files (the bar store layout by default),
+refits the hybrid ensemble on each expanding training window and scores every member,
+the ensemble and the Monte Carlo model on the bars that followed. Run it with
+
+    python -m app.backtest --fixtures data/bars --folds 4 --horizon 20 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from .utils.bar_store import BAR_STORE_DIR, normalize_bars
+from .utils.features import build_features
+from .utils.forecast_cache import FORECAST_MAX_HORIZON
+from .utils.simulation import realistic_paths, BAND_PERCENTILES
+
+try:
+    import resource
+except ImportError:  # Windows: no rusage, RSS figures are reported as None
+    resource = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HYBRID_MEMBERS = ['arima', 'prophet', 'xgb', 'lstm']
+MODELS = HYBRID_MEMBERS + ['ensemble', 'realistic']
+# z-score of the ensemble band (mean +/- z * member spread), matching the 5-95% Monte Carlo band
+ENSEMBLE_BAND_Z = 1.645
+# Featured rows a training window needs before a fold is scored
+MIN_TRAIN_ROWS = 120
+
+def load_fixtures(directory: str, symbols: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """Read OHLCV fixtures (<symbol>.parquet or <symbol>.csv) from a directory into the stored bar layout."""
+    frames = {}
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext not in ('.parquet', '.csv') or (symbols and stem not in symbols) or stem in frames:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            df = pd.read_parquet(path) if ext == '.parquet' else pd.read_csv(path)
+            frames[stem] = normalize_bars(df)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable fixture {path}: {str(e)}")
+    return frames
+
+def write_synthetic_fixtures(directory: str, symbols: List[str], days: int = 750, seed: int = 42):
+    """Write geometric random walk OHLCV fixtures, for running the harness without any market data."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    for symbol in symbols:
+        close = 100 * rng.uniform(0.5, 20) * np.cumprod(1 + rng.normal(0.0004, 0.015, days))
+        spread = np.abs(rng.normal(0, 0.008, days)) * close
+        open_ = close * (1 + rng.normal(0, 0.004, days))
+        pd.DataFrame({
+            'Date': dates,
+            'Open': open_,
+            'High': np.maximum(open_, close) + spread,
+            'Low': np.minimum(open_, close) - spread,
+            'Close': close,
+            'Volume': rng.lognormal(14, 0.4, days).round()
+        }).to_parquet(os.path.join(directory, f"{symbol}.parquet"), index=False)
+
+def walk_forward_splits(n: int, folds: int, horizon: int, min_train: int = 0) -> List[int]:
+    """
+    Cut points of expanding-window folds over n bars: fold k trains on bars[:cut] and is
+    scored on the next `horizon` bars, and the test windows tile the end of the history.
+    """
+    cuts = [n - horizon * (folds - k) for k in range(folds)]
+    return [cut for cut in cuts if cut >= min_train]
+
+def _max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+@contextmanager
+def measure(record: Dict, prefix: str, trace_memory: bool = False):
+    """
+    Time the block into record[f"{prefix}_seconds"] and record memory: the growth of the
+    process RSS high-water mark during the block, the high-water mark itself and, with
+    trace_memory, the peak of Python allocations (tracemalloc misses native buffers).
+    """
+    rss_before = _max_rss_mb()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[f"{prefix}_seconds"] = time.perf_counter() - started
+        rss_after = _max_rss_mb()
+        if rss_after is not None:
+            record[f"{prefix}_rss_growth_mb"] = rss_after - rss_before
+            record["max_rss_mb"] = rss_after
+        if trace_memory:
+            record[f"{prefix}_python_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+def score(pred: np.ndarray, actual: np.ndarray, last_close: float, lower: Optional[np.ndarray] = None,
+          upper: Optional[np.ndarray] = None) -> Dict[str, Optional[float]]:
+    """
+    MAPE over the horizon, directional accuracy (does each step land on the same side of
+    the last training close as the actual bar) and, when a band is given, its coverage.
+    """
+    pred = np.asarray(pred, dtype='float64')[:len(actual)]
+    return {
+        "mape": float(np.mean(np.abs(pred - actual) / np.abs(actual)) * 100),
+        "directional_accuracy": float(np.mean(np.sign(pred - last_close) == np.sign(actual - last_close))),
+        "coverage": float(np.mean((actual >= lower[:len(actual)]) & (actual <= upper[:len(actual)]))) if lower is not None else None
+    }
+
+def run_fold(symbol: str, bars: pd.DataFrame, cut: int, horizon: int, models: List[str],
+             threads: int = 1, trace_memory: bool = False, seed: int = 42) -> List[Dict]:
+    """Fit on bars[:cut], forecast the next `horizon` bars and return one record per model."""
+    train = build_features(bars.iloc[:cut])
+    actual = bars['Close'].to_numpy(dtype='float64')[cut:cut + horizon]
+    last_close = float(train['Close'].iloc[-1])
+    base = {"symbol": symbol, "cut_date": f"{pd.Timestamp(bars['Date'].iloc[cut]):%Y-%m-%d}", "train_rows": len(train)}
+    if trace_memory:
+        tracemalloc.start()
+    records = []
+
+    if any(model in models for model in HYBRID_MEMBERS + ['ensemble']):
+        from sklearn.preprocessing import MinMaxScaler
+        from prophet.serialize import model_from_json
+        from .ensemble import fit_arima, fit_prophet, fit_xgb, fit_lstm
+        from .model_registry import ModelBundle, data_version
+        from .predictor import FEATURES, predict_members
+
+        member_records = {name: dict(base, model=name) for name in HYBRID_MEMBERS}
+        scaler = MinMaxScaler()
+        X_scaled = scaler.fit_transform(train[FEATURES])
+        y = train['Close']
+        fits = {
+            'arima': lambda: fit_arima(y)[0],
+            'prophet': lambda: model_from_json(fit_prophet(train[['Date', 'Close']].rename(columns={'Date': 'ds', 'Close': 'y'}))[0]),
+            'xgb': lambda: fit_xgb(train[FEATURES], y, threads)[0],
+            'lstm': lambda: fit_lstm(X_scaled, y, threads)[0]
+        }
+        members = {}
+        for name, fit in fits.items():
+            with measure(member_records[name], "fit", trace_memory):
+                members[name] = fit()
+        bundle = ModelBundle(symbol=symbol, version=data_version(train), features=list(FEATURES), scaler=scaler, **members)
+
+        predict_seconds = {}
+        all_preds, _ = predict_members(bundle, train, len(actual), 0.0, predict_seconds)
+        for i, name in enumerate(HYBRID_MEMBERS):
+            member_records[name]["predict_seconds"] = predict_seconds[name]
+            member_records[name].update(score(all_preds[i], actual, last_close))
+            if name in models:
+                records.append(member_records[name])
+
+        if 'ensemble' in models:
+            mean, spread = all_preds.mean(axis=0), all_preds.std(axis=0)
+            records.append(dict(
+                base, model='ensemble',
+                fit_seconds=sum(r["fit_seconds"] for r in member_records.values()),
+                predict_seconds=sum(predict_seconds.values()),
+                max_rss_mb=_max_rss_mb(),
+                **score(mean, actual, last_close, mean - ENSEMBLE_BAND_Z * spread, mean + ENSEMBLE_BAND_Z * spread)
+            ))
+
+    if 'realistic' in models:
+        record = dict(base, model='realistic', fit_seconds=0.0)
+        with measure(record, "predict", trace_memory):
+            paths = realistic_paths(train['Close'].to_numpy(dtype='float64'), len(actual), rng=np.random.default_rng(seed))
+            lower, median, upper = np.percentile(paths, [BAND_PERCENTILES[0], 50.0, BAND_PERCENTILES[1]], axis=0)
+        record.update(score(median, actual, last_close, lower, upper))
+        records.append(record)
+
+    if trace_memory:
+        tracemalloc.stop()
+    return records
+
+def summarize(records: List[Dict]) -> Dict[str, Dict]:
+    """Per-model means of the accuracy and timing columns, and the worst memory figures."""
+    if not records:
+        return {}
+    df = pd.DataFrame(records)
+    summary = {}
+    for model, group in df.groupby('model', sort=False):
+        row = {"folds": int(len(group))}
+        for col in group.columns:
+            values = group[col].dropna()
+            if col in ('symbol', 'cut_date', 'model', 'train_rows') or values.empty:
+                continue
+            reduce = values.max() if col.endswith('_mb') else values.mean()
+            row[col] = round(float(reduce), 4)
+        summary[model] = row
+    return summary
+
+def run_backtest(frames: Dict[str, pd.DataFrame], folds: int = 4, horizon: int = 20, models: List[str] = MODELS,
+                 workers: int = 1, threads: int = 1, trace_memory: bool = False, seed: int = 42) -> Dict:
+    """
+    Backtest every symbol's folds, spreading (symbol, fold) tasks over `workers` spawned
+    processes. Returns the raw per-fold records with per-model and per-symbol summaries.
+    """
+    if not 1 <= horizon <= FORECAST_MAX_HORIZON:
+        raise ValueError(f"Horizon must be between 1 and {FORECAST_MAX_HORIZON} days")
+    tasks = []
+    for symbol, bars in frames.items():
+        # The first 49 bars only warm up the indicators and are dropped by build_features
+        for cut in walk_forward_splits(len(bars), folds, horizon, MIN_TRAIN_ROWS + 49):
+            tasks.append((symbol, bars, cut, horizon, models, threads, trace_memory, seed))
+    if not tasks:
+        raise ValueError(f"No symbol has enough bars for {folds} folds of {horizon} days")
+    logger.info(f"Backtesting {len(frames)} symbols, {len(tasks)} folds, horizon {horizon}, {workers} workers")
+
+    started = time.perf_counter()
+    records = []
+    if workers > 1:
+        # spawn, not fork: each worker gets its own clean TensorFlow/XGBoost thread pools
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for result in pool.map(run_fold, *zip(*tasks)):
+                records.extend(result)
+    else:
+        for task in tasks:
+            records.extend(run_fold(*task))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "config": {"symbols": list(frames), "folds": folds, "horizon": horizon, "models": list(models), "workers": workers, "threads": threads},
+        "wall_seconds": round(elapsed, 2),
+        "models": summarize(records),
+        "symbols": {symbol: summarize([r for r in records if r["symbol"] == symbol]) for symbol in frames},
+        "records": records
+    }
+
+def format_table(summary: Dict[str, Dict]) -> str:
+    columns = ['folds', 'mape', 'directional_accuracy', 'coverage', 'fit_seconds', 'predict_seconds', 'fit_rss_growth_mb', 'max_rss_mb']
+    lines = [f"{'model':<10}" + ''.join(f"{col:>22}" for col in columns)]
+    for model, row in summary.items():
+        lines.append(f"{model:<10}" + ''.join(f"{'-' if row.get(col) is None else row[col]:>22}" for col in columns))
+    return '\n'.join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the forecasting models on local OHLCV fixtures")
+    parser.add_argument("--fixtures", default=BAR_STORE_DIR, help="Directory of <symbol>.parquet/.csv OHLCV files")
+    parser.add_argument("--symbols", default="", help="Comma separated subset of fixture symbols")
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--horizon", type=int, default=20, help=f"Bars scored after each training window, at most {FORECAST_MAX_HORIZON}")
+    parser.add_argument("--models", default=','.join(MODELS), help=f"Comma separated subset of {','.join(MODELS)}")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="XGBoost/TensorFlow threads per worker")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report peak Python allocations (slower)")
+    parser.add_argument("--synthetic", type=int, default=0, help="First write this many random walk fixtures into --fixtures")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="", help="Write the full JSON report here")
+    args = parser.parse_args(argv)
+    if not 1 <= args.horizon <= FORECAST_MAX_HORIZON:
+        parser.error(f"--horizon must be between 1 and {FORECAST_MAX_HORIZON}")
+
+    if args.synthetic:
+        write_synthetic_fixtures(args.fixtures, [f"SYN{i:03d}" for i in range(args.synthetic)], seed=args.seed)
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    models = [m.strip() for m in args.models.split(',') if m.strip() in MODELS]
+    frames = load_fixtures(args.fixtures, symbols or None)
+    if not frames:
+        parser.error(f"No fixtures found in {args.fixtures}")
+
+    report = run_backtest(frames, args.folds, args.horizon, models, args.workers, args.threads, args.trace_memory, args.seed)
+    print(format_table(report["models"]))
+    print(f"\n{len(report['records'])} records in {report['wall_seconds']}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote backtest report to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "incremental" updates stored models when new bars arrive, "full" always refits from scratch
+MODEL_UPDATE_MODE = os.getenv("MODEL_UPDATE_MODE", "incremental")
+# Full refit after this many incremental updates in a row, or when this many bars arrived at once
+INCREMENTAL_MAX_UPDATES = int(os.getenv("INCREMENTAL_MAX_UPDATES", "20"))
+INCREMENTAL_MAX_NEW_BARS = int(os.getenv("INCREMENTAL_MAX_NEW_BARS", "20"))
+# Full refit when the new bars' feature means move this many training standard deviations
+DRIFT_FEATURE_Z = float(os.getenv("DRIFT_FEATURE_Z", "3.0"))
+# Full refit when XGBoost's error on the new bars exceeds this multiple of a naive last-close forecast
+DRIFT_ERROR_RATIO = float(os.getenv("DRIFT_ERROR_RATIO", "1.5"))
+# Fewer new bars than this are too noisy to judge the error ratio on
+DRIFT_MIN_BARS = 3
+
+def training_stats(df: pd.DataFrame, features: List[str], updates: int = 0, reference: Optional[Dict] = None) -> Dict:
+    """
+    Statistics stored with a bundle: the last bar it has seen, how many incremental
+    updates it went through and the feature distribution of its last full fit, which
+    later bars are compared with (carried over unchanged by incremental updates).
+    """
+    if reference is None:
+        values = df[features].to_numpy(dtype='float64')
+        reference = {
+            "feature_mean": np.nanmean(values, axis=0).tolist(),
+            "feature_std": np.nanstd(values, axis=0).tolist()
+        }
+    return {
+        "last_date": f"{pd.Timestamp(df['Date'].iloc[-1]):%Y-%m-%d}",
+        "updates": updates,
+        "feature_mean": reference["feature_mean"],
+        "feature_std": reference["feature_std"]
+    }
+
+def drift_metrics(bundle, df: pd.DataFrame) -> Dict:
+    """
+    How far the bars that arrived after a bundle was trained drift from what it saw:
+    the count of new bars, the largest shift of a feature mean in training standard
+    deviations, and XGBoost's MAPE on the new bars relative to a last-close forecast.
+    """
+    stats = bundle.stats
+    is_new = (df['Date'] > pd.Timestamp(stats["last_date"])).to_numpy()
+    new = df[is_new]
+    metrics = {"new_bars": int(len(new)), "feature_shift": 0.0, "error_ratio": None}
+    if new.empty:
+        return metrics
+
+    mean = np.asarray(stats["feature_mean"])
+    std = np.asarray(stats["feature_std"])
+    shift = np.abs(new[bundle.features].to_numpy(dtype='float64').mean(axis=0) - mean) / np.where(std > 0, std, 1.0)
+    metrics["feature_shift"] = round(float(np.nanmax(shift)), 3)
+
+    if len(new) >= DRIFT_MIN_BARS:
+        actual = new['Close'].to_numpy(dtype='float64')
+        previous_close = df['Close'].shift(1)[is_new].to_numpy(dtype='float64')
+        model_error = np.mean(np.abs(bundle.xgb.predict(new[bundle.features]) - actual) / actual)
+        naive_error = np.mean(np.abs(previous_close - actual) / actual)
+        metrics["error_ratio"] = round(float(model_error / max(naive_error, 1e-9)), 3)
+    return metrics
+
+def refit_reason(bundle, df: pd.DataFrame, features: List[str]) -> Optional[str]:
+    """Why a bundle needs a full refit on df rather than an incremental update, or None."""
+    if MODEL_UPDATE_MODE != "incremental":
+        return "incremental updates are disabled"
+    if not bundle.stats or list(bundle.features) != list(features):
+        return "no training statistics for the stored models"
+    if bundle.stats.get("updates", 0) >= INCREMENTAL_MAX_UPDATES:
+        return f"{bundle.stats['updates']} incremental updates since the last full fit"
+    metrics = drift_metrics(bundle, df)
+    if metrics["new_bars"] == 0:
+        return "no new bars since the last fit"
+    if metrics["new_bars"] > INCREMENTAL_MAX_NEW_BARS:
+        return f"{metrics['new_bars']} new bars"
+    if metrics["feature_shift"] > DRIFT_FEATURE_Z:
+        return f"feature drift of {metrics['feature_shift']} standard deviations"
+    if metrics["error_ratio"] is not None and metrics["error_ratio"] > DRIFT_ERROR_RATIO:
+        return f"error {metrics['error_ratio']}x a last-close forecast on the new bars"
+    return None
@@ -0,0 +1,242 @@
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from .utils.forecast_cache import FORECAST_MAX_HORIZON
+from .utils.windowing import (
+    LSTM_FORECAST_MODE, LSTM_LOOKBACK, forward_ratios, segment_starts, steps_per_epoch, window_batches
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "parallel" fits the four members concurrently, "sequential" keeps the old one-after-another order
+ENSEMBLE_MODE = os.getenv("ENSEMBLE_MODE", "parallel")
+# Threads each of XGBoost and TensorFlow may use, so concurrent members don't oversubscribe cores
+ENSEMBLE_MEMBER_THREADS = int(os.getenv("ENSEMBLE_MEMBER_THREADS", str(max(1, (os.cpu_count() or 4) // 4))))
+# Worker processes for the GIL-bound statsmodels/Prophet fits
+ENSEMBLE_PROCESSES = int(os.getenv("ENSEMBLE_PROCESSES", "2"))
+
+# Incremental updates when new bars arrive: most recent rows the LSTM and XGBoost are updated on,
+# boosting rounds added to the stored booster and fine-tuning epochs for the previous LSTM weights
+INCREMENTAL_WINDOW = int(os.getenv("INCREMENTAL_WINDOW", "120"))
+INCREMENTAL_XGB_TREES = int(os.getenv("INCREMENTAL_XGB_TREES", "10"))
+INCREMENTAL_LSTM_EPOCHS = int(os.getenv("INCREMENTAL_LSTM_EPOCHS", "2"))
+
+_process_pool = None
+_thread_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ensemble")
+_tf_threads_configured = False
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn, not fork: the parent may already hold TensorFlow/XGBoost thread pools
+        _process_pool = ProcessPoolExecutor(max_workers=ENSEMBLE_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+def _configure_tf_threads(threads: int):
+    global _tf_threads_configured
+    if _tf_threads_configured:
+        return
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+    except RuntimeError as e:
+        # TensorFlow was already initialised elsewhere; its pools can't be resized any more
+        logger.warning(f"Could not cap TensorFlow threads: {str(e)}")
+    _tf_threads_configured = True
+
+def fit_arima(y: pd.Series) -> Tuple[object, float]:
+    from statsmodels.tsa.arima.model import ARIMA
+    started = time.perf_counter()
+    model = ARIMA(y, order=(5,1,0)).fit()
+    return model, time.perf_counter() - started
+
+def fit_prophet(prophet_df: pd.DataFrame, init: Optional[Dict] = None) -> Tuple[str, float]:
+    """
+    Fit Prophet and return it serialised, since Prophet objects don't pickle reliably between processes.
+    init warm-starts the optimizer from a previous fit's parameters (see prophet_warm_start).
+    """
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+    started = time.perf_counter()
+    model = Prophet(daily_seasonality=True)
+    if init is not None:
+        model.fit(prophet_df, init=init)
+    else:
+        model.fit(prophet_df)
+    return model_to_json(model), time.perf_counter() - started
+
+def prophet_warm_start(model) -> Dict:
+    """Initial values for the Stan optimizer taken from a fitted (MAP) Prophet model."""
+    params = {name: float(model.params[name][0][0]) for name in ['k', 'm', 'sigma_obs']}
+    params.update({name: model.params[name][0] for name in ['delta', 'beta']})
+    return params
+
+def fit_xgb(X: pd.DataFrame, y: pd.Series, n_jobs: int) -> Tuple[object, float]:
+    from xgboost import XGBRegressor
+    started = time.perf_counter()
+    model = XGBRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    model.fit(X, y)  # Use unscaled for XGBoost (tree-based)
+    return model, time.perf_counter() - started
+
+def update_xgb(previous, X: pd.DataFrame, y: pd.Series, n_jobs: int, trees: int = INCREMENTAL_XGB_TREES) -> Tuple[object, float]:
+    """Continue boosting from a fitted model's booster with `trees` more rounds on recent rows."""
+    from xgboost import XGBRegressor
+    started = time.perf_counter()
+    model = XGBRegressor(n_estimators=trees, random_state=42, n_jobs=n_jobs)
+    model.fit(X, y, xgb_model=previous.get_booster())
+    return model, time.perf_counter() - started
+
+def masked_mse(y_true, y_pred):
+    """Mean squared error over the finite targets only: recent rows have no long-horizon label yet."""
+    import tensorflow as tf
+    mask = tf.math.is_finite(y_true)
+    diff = tf.where(mask, y_true - y_pred, tf.zeros_like(y_pred))
+    count = tf.maximum(tf.reduce_sum(tf.cast(mask, y_pred.dtype), axis=-1), 1.0)
+    return tf.reduce_sum(tf.square(diff), axis=-1) / count
+
+def lstm_samples(X_scaled: np.ndarray, y: pd.Series, lookback: int, steps: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Targets and window start rows for the LSTM: each window of `lookback` rows is labelled
+    with the relative change of the close 1..steps rows after its last row. Windows whose
+    next close is not known yet are left out.
+    """
+    targets = forward_ratios(y, steps).astype('float32')
+    starts = segment_starts([len(X_scaled)], lookback)
+    return targets, starts[np.isfinite(targets[starts + lookback - 1, 0])]
+
+def fit_lstm(X_scaled: np.ndarray, y: pd.Series, threads: int, lookback: int = LSTM_LOOKBACK,
+             mode: str = LSTM_FORECAST_MODE) -> Tuple[object, float]:
+    """
+    Fit the LSTM on sliding windows of the scaled features. "direct" mode outputs all
+    FORECAST_MAX_HORIZON steps at once, "recursive" mode only the next step, which
+    predict_members feeds back in; the model's own shapes record which one it is.
+    """
+    _configure_tf_threads(threads)
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense
+    started = time.perf_counter()
+    steps = FORECAST_MAX_HORIZON if mode == "direct" else 1
+    X_scaled = np.asarray(X_scaled, dtype='float32')
+    targets, starts = lstm_samples(X_scaled, y, lookback, steps)
+    model = Sequential([
+        LSTM(50, return_sequences=True, input_shape=(lookback, X_scaled.shape[1])),
+        LSTM(50),
+        Dense(steps)
+    ])
+    model.compile(optimizer='adam', loss=masked_mse)
+    model.fit(
+        window_batches(X_scaled, targets, starts, lookback), steps_per_epoch=steps_per_epoch(len(starts)),
+        epochs=10, verbose=0
+    )
+    return model, time.perf_counter() - started
+
+def update_lstm(previous, X_scaled: np.ndarray, y: pd.Series, threads: int, epochs: int = INCREMENTAL_LSTM_EPOCHS,
+                recent: int = INCREMENTAL_WINDOW) -> Tuple[object, float]:
+    """
+    Fine-tune a copy of a fitted LSTM on the windows ending in the last `recent` rows.
+    The served model is never modified, so predictions running on it concurrently are
+    unaffected.
+    """
+    _configure_tf_threads(threads)
+    from keras.models import clone_model
+    started = time.perf_counter()
+    lookback, steps = previous.input_shape[1], previous.output_shape[-1]
+    X_scaled = np.asarray(X_scaled, dtype='float32')
+    targets, starts = lstm_samples(X_scaled, y, lookback, steps)
+    starts = starts[starts + lookback - 1 >= len(X_scaled) - recent]
+    model = clone_model(previous)
+    model.set_weights(previous.get_weights())
+    model.compile(optimizer='adam', loss=masked_mse)
+    model.fit(
+        window_batches(X_scaled, targets, starts, lookback), steps_per_epoch=steps_per_epoch(len(starts)),
+        epochs=epochs, verbose=0
+    )
+    return model, time.perf_counter() - started
+
+def fit_members(df: pd.DataFrame, features: list, X_scaled: np.ndarray, mode: str = None) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """
+    Fit ARIMA, Prophet, XGBoost and the LSTM on one featured frame.
+
+    In parallel mode ARIMA and Prophet run in a spawned process pool while XGBoost and
+    the LSTM run on threads of this process (both release the GIL in native code),
+    each capped at ENSEMBLE_MEMBER_THREADS. Returns the fitted members and the seconds
+    each member spent fitting.
+    """
+    from prophet.serialize import model_from_json
+    mode = mode or ENSEMBLE_MODE
+    X = df[features]
+    y = df['Close']
+    prophet_df = df[['Date', 'Close']].rename(columns={'Date': 'ds', 'Close': 'y'})
+    threads = ENSEMBLE_MEMBER_THREADS
+
+    if mode == "parallel":
+        futures = {
+            'arima': _get_process_pool().submit(fit_arima, y),
+            'prophet': _get_process_pool().submit(fit_prophet, prophet_df),
+            'xgb': _thread_pool.submit(fit_xgb, X, y, threads),
+            'lstm': _thread_pool.submit(fit_lstm, X_scaled, y, threads)
+        }
+        results = {name: future.result() for name, future in futures.items()}
+    else:
+        results = {
+            'arima': fit_arima(y),
+            'prophet': fit_prophet(prophet_df),
+            'xgb': fit_xgb(X, y, threads),
+            'lstm': fit_lstm(X_scaled, y, threads)
+        }
+
+    members = {name: result[0] for name, result in results.items()}
+    members['prophet'] = model_from_json(members['prophet'])
+    timings = {name: round(result[1], 3) for name, result in results.items()}
+    logger.info(f"Fitted ensemble members ({mode}) in {timings}")
+    return members, timings
+
+def update_members(previous: Dict[str, object], df: pd.DataFrame, features: list, X_scaled: np.ndarray,
+                   mode: str = None) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """
+    Bring fitted members up to date with new bars instead of refitting them from scratch.
+
+    ARIMA keeps its parameters and is re-applied to the whole close series, Prophet is
+    refit with its optimizer started from the previous solution, and XGBoost (extra
+    boosting rounds) and the LSTM (a few epochs from its previous weights) are updated
+    on the last INCREMENTAL_WINDOW rows; the LSTM's windows still look back past them.
+    X_scaled must come from the previous scaler.
+    """
+    from prophet.serialize import model_from_json
+    mode = mode or ENSEMBLE_MODE
+    recent = slice(-INCREMENTAL_WINDOW, None)
+    X = df[features].iloc[recent]
+    y = df['Close'].iloc[recent]
+    prophet_df = df[['Date', 'Close']].rename(columns={'Date': 'ds', 'Close': 'y'})
+    init = prophet_warm_start(previous['prophet'])
+    threads = ENSEMBLE_MEMBER_THREADS
+
+    started = time.perf_counter()
+    arima = previous['arima'].apply(df['Close'])
+    results = {'arima': (arima, time.perf_counter() - started)}
+    if mode == "parallel":
+        futures = {
+            'prophet': _get_process_pool().submit(fit_prophet, prophet_df, init),
+            'xgb': _thread_pool.submit(update_xgb, previous['xgb'], X, y, threads),
+            'lstm': _thread_pool.submit(update_lstm, previous['lstm'], X_scaled, df['Close'], threads)
+        }
+        results.update({name: future.result() for name, future in futures.items()})
+    else:
+        results.update({
+            'prophet': fit_prophet(prophet_df, init),
+            'xgb': update_xgb(previous['xgb'], X, y, threads),
+            'lstm': update_lstm(previous['lstm'], X_scaled, df['Close'], threads)
+        })
+
+    members = {name: result[0] for name, result in results.items()}
+    members['prophet'] = model_from_json(members['prophet'])
+    timings = {name: round(result[1], 3) for name, result in results.items()}
+    logger.info(f"Updated ensemble members ({mode}) in {timings}")
+    return members, timings
@@ -0,0 +1,47 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from .model_registry import ModelBundle
+from .backends import backends
+from .utils.metrics import span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_explainer_lock = threading.Lock()
+
+def tree_explainer(bundle: ModelBundle):
+    """
+    The SHAP TreeExplainer of a bundle's XGBoost model, built once on first use and kept
+    on the bundle, so it lives exactly as long as the fitted model it explains.
+    """
+    if bundle.explainer is None:
+        with _explainer_lock:
+            if bundle.explainer is None:
+                bundle.explainer = backends.get("shap").TreeExplainer(bundle.xgb)
+    return bundle.explainer
+
+def shap_matrix(bundle: ModelBundle, rows: np.ndarray) -> np.ndarray:
+    """SHAP values for many feature rows in one vectorized call, shaped (rows, features)."""
+    rows = np.atleast_2d(np.asarray(rows, dtype='float64'))
+    with span("shap"):
+        return np.asarray(tree_explainer(bundle).shap_values(rows)).reshape(len(rows), -1)
+
+def attributions(features: List[str], values: np.ndarray) -> List[Dict]:
+    return [{"feature": f, "value": round(float(v), 4)} for f, v in zip(features, values)]
+
+def explain_rows(bundle: ModelBundle, rows: np.ndarray) -> List[List[Dict]]:
+    """Per-feature attributions for each row, as returned by the prediction endpoints."""
+    return [attributions(bundle.features, values) for values in shap_matrix(bundle, rows)]
+
+def explain_latest(bundle: Optional[ModelBundle], featured: pd.DataFrame) -> Optional[List[Dict]]:
+    """Attributions for the most recent bar of a featured frame, or None without a usable bundle."""
+    if bundle is None or featured.empty:
+        return None
+    try:
+        return explain_rows(bundle, featured[bundle.features].to_numpy()[-1:])[0]
+    except Exception as e:
+        logger.warning(f"SHAP explanation failed for {bundle.symbol}: {str(e)}")
+        return None
@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from .model_registry import MODEL_DIR, MODEL_MAX_AGE_HOURS, data_version
+from .ensemble import ENSEMBLE_MEMBER_THREADS, _configure_tf_threads, masked_mse
+from .utils.data_loader import fetch_historical_many
+from .utils.features import build_feature_panel
+from .utils.forecast_cache import FORECAST_MAX_HORIZON
+from .utils.metrics import span, timed
+from .utils.watchlists import symbol_sectors, warmup_symbols
+from .utils.windowing import LSTM_LOOKBACK, segment_starts, steps_per_epoch, window_batches
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "per_symbol" fits the four-model ensemble for every symbol, "global" serves hybrid
+# predictions from one XGBoost and one sequence model trained across all tracked symbols
+HYBRID_MODE = os.getenv("HYBRID_MODE", "per_symbol")
+GLOBAL_MODEL_DIR = os.getenv("GLOBAL_MODEL_DIR", os.path.join(MODEL_DIR, "_global"))
+# Rows of history each sequence-model sample sees
+GLOBAL_LOOKBACK = int(os.getenv("GLOBAL_LOOKBACK", str(LSTM_LOOKBACK)))
+GLOBAL_EPOCHS = int(os.getenv("GLOBAL_EPOCHS", "5"))
+GLOBAL_XGB_TREES = int(os.getenv("GLOBAL_XGB_TREES", "300"))
+# Bars ahead the models forecast log returns for; days in between are interpolated
+GLOBAL_HORIZONS = [1, 5, 10, 20, 40, 60, FORECAST_MAX_HORIZON]
+# Horizon whose XGBoost attributions are reported as the SHAP values
+GLOBAL_EXPLAIN_HORIZON = 20
+# Share of training rows whose symbol is hidden, so the unknown-symbol embedding learns a universe average
+SYMBOL_DROPOUT = 0.1
+SYMBOL_EMBEDDING_DIM = 8
+SECTOR_EMBEDDING_DIM = 4
+# Bump when the global model's features or layout change so stored models are ignored
+GLOBAL_FORMAT_VERSION = 1
+UNKNOWN = "<unknown>"
+
+GLOBAL_FEATURES = [
+    'open_gap', 'high_range', 'low_range', 'sma_20_gap', 'sma_50_gap', 'rsi', 'macd_ratio',
+    'bb_upper_gap', 'bb_lower_gap', 'volume_ratio', 'return_1', 'return_5', 'return_20'
+]
+
+def global_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scale-free features of a featured frame (from build_features): prices relative to
+    the close, log volume against its average and trailing log returns, so one model
+    can learn from symbols trading at very different price levels.
+    """
+    close = df['Close'].to_numpy(dtype='float64')
+    log_close = pd.Series(np.log(close))
+    out = pd.DataFrame({
+        'open_gap': df['Open'].to_numpy() / close - 1,
+        'high_range': df['High'].to_numpy() / close - 1,
+        'low_range': df['Low'].to_numpy() / close - 1,
+        'sma_20_gap': df['sma_20'].to_numpy() / close - 1,
+        'sma_50_gap': df['sma_50'].to_numpy() / close - 1,
+        'rsi': df['rsi_14'].to_numpy() / 100.0,
+        'macd_ratio': df['macd'].to_numpy() / close,
+        'bb_upper_gap': df['bb_upper'].to_numpy() / close - 1,
+        'bb_lower_gap': df['bb_lower'].to_numpy() / close - 1,
+        'volume_ratio': np.log((df['Volume'].to_numpy() + 1.0) / (df['volume_sma_20'].to_numpy() + 1.0)),
+        'return_1': log_close.diff(1).to_numpy(),
+        'return_5': log_close.diff(5).to_numpy(),
+        'return_20': log_close.diff(20).to_numpy()
+    })
+    return out
+
+def forward_returns(close: np.ndarray, horizons: List[int]) -> np.ndarray:
+    """(rows, horizons) log return from each row's close to the close h bars later; NaN past the end."""
+    log_close = np.log(np.asarray(close, dtype='float64'))
+    out = np.full((len(log_close), len(horizons)), np.nan)
+    for k, h in enumerate(horizons):
+        out[:-h, k] = log_close[h:] - log_close[:-h]
+    return out
+
+def interpolate_path(grid_returns: np.ndarray, horizons: List[int], days: int = FORECAST_MAX_HORIZON) -> np.ndarray:
+    """Daily log returns for days 1..days from (symbols, horizons) forecasts, linear between grid points."""
+    x = np.asarray([0] + list(horizons), dtype='float64')
+    y = np.concatenate([np.zeros((len(grid_returns), 1)), grid_returns], axis=1)
+    steps = np.arange(1, days + 1, dtype='float64')
+    upper = np.clip(np.searchsorted(x, steps), 1, len(x) - 1)
+    weight = (steps - x[upper - 1]) / (x[upper] - x[upper - 1])
+    return y[:, upper - 1] * (1 - weight) + y[:, upper] * weight
+
+def _xgb_frame(X: np.ndarray, symbol_ids: np.ndarray, sector_ids: np.ndarray, symbols: List[str], sectors: List[str],
+               horizons: List[int]) -> pd.DataFrame:
+    """Long layout for the XGBoost member: every row repeated once per horizon, with the horizon as a feature."""
+    n, H = len(X), len(horizons)
+    frame = pd.DataFrame(np.repeat(X, H, axis=0), columns=GLOBAL_FEATURES)
+    frame['horizon'] = np.tile(np.asarray(horizons, dtype='float64'), n)
+    frame['symbol'] = pd.Categorical.from_codes(np.repeat(symbol_ids, H), categories=symbols)
+    frame['sector'] = pd.Categorical.from_codes(np.repeat(sector_ids, H), categories=sectors)
+    return frame
+
+def build_sequence_model(n_features: int, n_symbols: int, n_sectors: int, n_horizons: int, lookback: int = GLOBAL_LOOKBACK):
+    """LSTM over the feature window, joined with symbol and sector embeddings, one output per horizon."""
+    from keras.models import Model
+    from keras.layers import Input, LSTM, Dense, Embedding, Flatten, Concatenate
+    window = Input(shape=(lookback, n_features), name="window")
+    symbol = Input(shape=(1,), dtype='int32', name="symbol")
+    sector = Input(shape=(1,), dtype='int32', name="sector")
+    encoded = LSTM(64)(window)
+    symbol_vector = Flatten()(Embedding(n_symbols, SYMBOL_EMBEDDING_DIM)(symbol))
+    sector_vector = Flatten()(Embedding(n_sectors, SECTOR_EMBEDDING_DIM)(sector))
+    hidden = Dense(64, activation='relu')(Concatenate()([encoded, symbol_vector, sector_vector]))
+    model = Model(inputs=[window, symbol, sector], outputs=Dense(n_horizons)(hidden))
+    model.compile(optimizer='adam', loss=masked_mse)
+    return model
+
+@dataclass
+class GlobalModel:
+    """One XGBoost and one sequence model over the whole universe, forecasting log returns on a horizon grid."""
+    symbols: List[str]
+    sectors: List[str]
+    symbol_sector: Dict[str, str]
+    horizons: List[int]
+    lookback: int
+    # Standardisation of the sequence model's inputs and targets
+    feature_mean: List[float]
+    feature_std: List[float]
+    target_std: List[float]
+    xgb: Any
+    sequence: Any
+    version: str
+    rows: int
+    trained_at: datetime = field(default_factory=datetime.now)
+    fit_seconds: Dict[str, float] = field(default_factory=dict)
+
+    def is_expired(self, max_age_hours: float = MODEL_MAX_AGE_HOURS) -> bool:
+        return datetime.now() - self.trained_at > timedelta(hours=max_age_hours)
+
+    def ids(self, symbol: str):
+        """(symbol id, sector id); symbols and sectors unseen in training map to the unknown entries."""
+        symbol = symbol.strip().upper()
+        symbol_id = self.symbols.index(symbol) if symbol in self.symbols else 0
+        sector = self.symbol_sector.get(symbol) or symbol_sectors().get(symbol, UNKNOWN)
+        return symbol_id, self.sectors.index(sector) if sector in self.sectors else 0
+
+    @timed("global_predict")
+    def forecast(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, Dict]:
+        """
+        Forecast every symbol of featured frames with one batched call per member. Returns
+        per symbol the daily predicted closes of each member out to FORECAST_MAX_HORIZON
+        and the XGBoost attributions of its latest row.
+        """
+        from xgboost import DMatrix
+        symbols = [s for s, df in frames.items() if len(df) >= self.lookback]
+        if not symbols:
+            return {}
+        ids = np.array([self.ids(s) for s in symbols])
+        features = {s: global_features(frames[s]).to_numpy(dtype='float64')[-self.lookback:] for s in symbols}
+        latest = np.stack([features[s][-1] for s in symbols])
+
+        rows = _xgb_frame(latest, ids[:, 0], ids[:, 1], self.symbols, self.sectors, self.horizons)
+        xgb_grid = self.xgb.predict(rows).reshape(len(symbols), len(self.horizons))
+
+        mean, std = np.asarray(self.feature_mean), np.asarray(self.feature_std)
+        windows = np.nan_to_num((np.stack([features[s] for s in symbols]) - mean) / std)
+        seq_grid = self.sequence.predict([windows, ids[:, :1], ids[:, 1:]], verbose=0) * np.asarray(self.target_std)
+
+        explained = rows[rows['horizon'] == GLOBAL_EXPLAIN_HORIZON]
+        contributions = self.xgb.get_booster().predict(DMatrix(explained, enable_categorical=True), pred_contribs=True)
+        last_close = np.array([float(frames[s]['Close'].iloc[-1]) for s in symbols])
+        paths = {
+            "xgb": last_close[:, None] * np.exp(interpolate_path(xgb_grid, self.horizons)),
+            "sequence": last_close[:, None] * np.exp(interpolate_path(seq_grid, self.horizons))
+        }
+        names = list(explained.columns)
+        return {
+            s: {
+                "members": np.vstack([paths["xgb"][i], paths["sequence"][i]]),
+                "last_date": frames[s]['Date'].iloc[-1],
+                # Bias term last; the horizon column is constant here and carries no attribution
+                "shap": [
+                    {"feature": name, "value": round(float(value), 4)}
+                    for name, value in zip(names, contributions[i][:-1]) if name != 'horizon'
+                ]
+            }
+            for i, s in enumerate(symbols)
+        }
+
+@timed("global_fit")
+def train_global_model(frames: Dict[str, pd.DataFrame], sectors: Optional[Dict[str, str]] = None,
+                       horizons: List[int] = GLOBAL_HORIZONS, lookback: int = GLOBAL_LOOKBACK, seed: int = 42) -> GlobalModel:
+    """
+    Fit the global members on the stacked panel of featured frames (symbol -> build_features
+    output). Training cost grows with total rows: the per-symbol overhead is only feature
+    stacking, and each member is fitted once for the whole universe.
+    """
+    from xgboost import XGBRegressor
+    sectors = sectors if sectors is not None else symbol_sectors()
+    rng = np.random.default_rng(seed)
+    symbol_vocab = [UNKNOWN] + sorted(s.strip().upper() for s in frames)
+    sector_vocab = [UNKNOWN] + sorted(set(sectors.get(s.strip().upper(), UNKNOWN) for s in frames) - {UNKNOWN})
+
+    X_parts, y_parts, symbol_ids, sector_ids = [], [], [], []
+    for symbol, df in frames.items():
+        X = global_features(df).to_numpy(dtype='float64')
+        y = forward_returns(df['Close'].to_numpy(), horizons)
+        usable = np.isfinite(X).all(axis=1)
+        X, y = X[usable], y[usable]
+        if len(X) < lookback:
+            continue
+        X_parts.append(X)
+        y_parts.append(y)
+        key = symbol.strip().upper()
+        symbol_ids.append(np.full(len(X), symbol_vocab.index(key)))
+        sector_ids.append(np.full(len(X), sector_vocab.index(sectors.get(key, UNKNOWN))))
+    if not X_parts:
+        raise ValueError("Not enough history to train the global model")
+
+    X, y = np.concatenate(X_parts), np.concatenate(y_parts)
+    symbol_ids, sector_ids = np.concatenate(symbol_ids), np.concatenate(sector_ids)
+    hidden = rng.random(len(X)) < SYMBOL_DROPOUT
+    symbol_ids = np.where(hidden, 0, symbol_ids)
+    timings = {}
+
+    started = time.perf_counter()
+    long = _xgb_frame(X, symbol_ids, sector_ids, symbol_vocab, sector_vocab, horizons)
+    target = y.reshape(-1)
+    labelled = np.isfinite(target)
+    xgb = XGBRegressor(
+        n_estimators=GLOBAL_XGB_TREES, learning_rate=0.05, max_depth=6, tree_method='hist',
+        enable_categorical=True, random_state=seed, n_jobs=ENSEMBLE_MEMBER_THREADS
+    )
+    xgb.fit(long[labelled], target[labelled])
+    timings["xgb"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    _configure_tf_threads(ENSEMBLE_MEMBER_THREADS)
+    feature_mean, feature_std = X.mean(axis=0), X.std(axis=0) + 1e-9
+    target_std = np.nanstd(y, axis=0) + 1e-9
+    scaled = ((X - feature_mean) / feature_std).astype('float32')
+    # Sequence samples are the windows inside one symbol's rows, gathered a batch at a time
+    starts = segment_starts([len(part) for part in X_parts], lookback)
+    sequence = build_sequence_model(X.shape[1], len(symbol_vocab), len(sector_vocab), len(horizons), lookback)
+    sequence.fit(
+        window_batches(scaled, (y / target_std).astype('float32'), starts, lookback, 256, extras=[symbol_ids, sector_ids], seed=seed),
+        steps_per_epoch=steps_per_epoch(len(starts), 256), epochs=GLOBAL_EPOCHS, verbose=0
+    )
+    timings["sequence"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Trained global model on {len(X)} rows of {len(X_parts)} symbols in {timings}")
+
+    return GlobalModel(
+        symbols=symbol_vocab,
+        sectors=sector_vocab,
+        symbol_sector={s: sectors[s] for s in symbol_vocab if s in sectors},
+        horizons=list(horizons),
+        lookback=lookback,
+        feature_mean=feature_mean.tolist(),
+        feature_std=feature_std.tolist(),
+        target_std=target_std.tolist(),
+        xgb=xgb,
+        sequence=sequence,
+        version=','.join(f"{s}:{data_version(df)}" for s, df in sorted(frames.items())),
+        rows=int(len(X)),
+        fit_seconds=timings
+    )
+
+class GlobalModelStore:
+    """
+    The current global model, persisted on disk and retrained in the background once it
+    is older than MODEL_MAX_AGE_HOURS. Only the very first use trains on the calling thread.
+    """
+
+    def __init__(self, directory: str = GLOBAL_MODEL_DIR, max_age_hours: float = MODEL_MAX_AGE_HOURS):
+        self.directory = directory
+        self.max_age_hours = max_age_hours
+        self._model: Optional[GlobalModel] = None
+        self._lock = threading.Lock()
+        self._training = None
+        self._trainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="global-train")
+
+    def save(self, model: GlobalModel):
+        tmp_path = self.directory + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        model.xgb.save_model(os.path.join(tmp_path, 'xgb.json'))
+        model.sequence.save(os.path.join(tmp_path, 'sequence.keras'))
+        meta = {name: getattr(model, name) for name in (
+            'symbols', 'sectors', 'symbol_sector', 'horizons', 'lookback', 'feature_mean', 'feature_std',
+            'target_std', 'version', 'rows', 'fit_seconds'
+        )}
+        meta.update({'format': GLOBAL_FORMAT_VERSION, 'trained_at': model.trained_at.isoformat()})
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp_path, self.directory)
+
+    def load(self) -> Optional[GlobalModel]:
+        try:
+            with open(os.path.join(self.directory, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.pop('format', None) != GLOBAL_FORMAT_VERSION:
+                logger.info("Ignoring stored global model in an older format")
+                return None
+            from xgboost import XGBRegressor
+            from keras.models import load_model
+            xgb = XGBRegressor()
+            xgb.load_model(os.path.join(self.directory, 'xgb.json'))
+            xgb.set_params(enable_categorical=True, tree_method='hist', n_jobs=ENSEMBLE_MEMBER_THREADS)
+            sequence = load_model(os.path.join(self.directory, 'sequence.keras'), compile=False)
+            meta['trained_at'] = datetime.fromisoformat(meta['trained_at'])
+            return GlobalModel(xgb=xgb, sequence=sequence, **meta)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to load the stored global model: {str(e)}")
+            return None
+
+    def train(self, symbols: Optional[List[str]] = None) -> GlobalModel:
+        """Fetch and feature every tracked symbol in one pass, then fit, store and serve a new global model."""
+        symbols = symbols or warmup_symbols()
+        histories = fetch_historical_many(symbols)
+        with span("build_features"):
+            frames = build_feature_panel({symbol: df for symbol, (_, df) in histories.items()})
+        model = train_global_model(frames)
+        self._model = model
+        try:
+            self.save(model)
+        except Exception as e:
+            logger.warning(f"Failed to persist the global model: {str(e)}")
+        return model
+
+    def schedule_train(self, symbols: Optional[List[str]] = None):
+        """Retrain in the background unless a retrain is already running."""
+        with self._lock:
+            if self._training is None or self._training.done():
+                self._training = self._trainer.submit(self.train, symbols)
+            return self._training
+
+    def get(self) -> GlobalModel:
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.load()
+                model = self._model
+        if model is None:
+            # Serialised with background retrains so the universe is only fetched and fitted once
+            model = self.schedule_train().result()
+        elif model.is_expired(self.max_age_hours):
+            self.schedule_train()
+        return model
+
+    def status(self) -> Dict:
+        model = self._model
+        return {
+            "mode": HYBRID_MODE,
+            "loaded": model is not None,
+            "training": self._training is not None and not self._training.done(),
+            "trained_at": model.trained_at.isoformat() if model else None,
+            "symbols": len(model.symbols) - 1 if model else 0,
+            "rows": model.rows if model else 0,
+            "fit_seconds": model.fit_seconds if model else {}
+        }
+
+global_model_store = GlobalModelStore()
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set
+from .utils.metrics import record_cache, record_upstream_error, span
+from .utils.response_cache import CachedResponse, MemoryBackend, create_backend
+from .utils.concurrency import run_blocking
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "gemini", "fake" (local stand-in for tests and demos) or "none"; defaults to gemini when a key is set
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini" if os.getenv("GOOGLE_API_KEY") else "none")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+# Upper bound on LLM calls per minute across the whole worker
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "30"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+# How long finished explanations stay retrievable by token in a shared (redis) cache
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+# A pending entry left behind by a worker that died is given up on after this long
+LLM_PENDING_TTL_SECONDS = 600
+# Artificial latency of the fake backend, to exercise the pending state
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "0"))
+# SHAP values are rounded to this many decimals before hashing, so near-identical attributions share a text
+SHAP_ROUND_DIGITS = 2
+
+def explanation_token(symbol: str, shap_dict: List[Dict]) -> str:
+    """Cache key and public token for the explanation of a symbol's rounded SHAP vector."""
+    rounded = ','.join(f"{item['feature']}={round(float(item['value']), SHAP_ROUND_DIGITS):+.{SHAP_ROUND_DIGITS}f}" for item in shap_dict)
+    return hashlib.sha1(f"{symbol.strip().upper()}|{rounded}".encode('utf-8')).hexdigest()[:24]
+
+def build_prompt(symbol: str, shap_dict: List[Dict]) -> str:
+    return f"Explain these SHAP values for {symbol} stock prediction in simple English. Make it engaging and easy to understand, like talking to a beginner investor. SHAP values: {shap_dict}"
+
+def template_explanation(symbol: str, shap_dict: List[Dict]) -> str:
+    """Instant explanation naming the strongest drivers, returned while the LLM text is generated."""
+    top = sorted(shap_dict, key=lambda item: abs(item['value']), reverse=True)[:3]
+    drivers = ', '.join(f"{item['feature']} ({'+' if item['value'] >= 0 else '-'})" for item in top)
+    return f"Stock prediction for {symbol}: The model considers various technical indicators. The strongest drivers are {drivers}. Higher values indicate stronger positive impact on price prediction."
+
+class FakeLLM:
+    """Deterministic local stand-in with the same ainvoke() shape as the LangChain chat models."""
+
+    class Response:
+        def __init__(self, content: str):
+            self.content = content
+
+    async def ainvoke(self, prompt: str):
+        if LLM_FAKE_LATENCY_MS:
+            await asyncio.sleep(LLM_FAKE_LATENCY_MS / 1000.0)
+        digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]
+        return self.Response(f"[fake-llm {digest}] {prompt[:120]}")
+
+def create_llm(backend: str = LLM_BACKEND):
+    if backend == "fake":
+        return FakeLLM()
+    if backend == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=LLM_MODEL, google_api_key=os.getenv("GOOGLE_API_KEY"))
+    return None
+
+class ExplanationWorker:
+    """
+    Generates LLM explanations off the request path.
+
+    submit() is cheap, thread-safe and never touches the cache: it returns the token for
+    a symbol's SHAP vector and hands it to the event loop, which queues generation
+    unless the token is cached or already queued. One async worker with a shared
+    client drains the queue, spacing calls to stay under LLM_RATE_PER_MINUTE. Cache
+    reads and writes from the loop go through the I/O executor when the backend is remote.
+
+    Entries are kept by token in the response cache backend. With
+    RESPONSE_CACHE_BACKEND=redis every worker can answer for a token issued by any
+    other; the in-process default (an LRU of LLM_CACHE_SIZE) only knows the tokens of
+    its own worker, so run a single worker or use redis when serving several.
+    """
+
+    def __init__(self, backend: str = LLM_BACKEND, rate_per_minute: float = LLM_RATE_PER_MINUTE, cache_size: int = LLM_CACHE_SIZE,
+                 store=None):
+        self.backend = backend
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.cache_size = cache_size
+        self.store = store
+        self._queued: Set[str] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._llm = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend in ("gemini", "fake")
+
+    def start(self):
+        """Start the worker on the running event loop."""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _store(self):
+        if self.store is None:
+            with self._lock:
+                if self.store is None:
+                    self.store = create_backend(capacity=self.cache_size)
+        return self.store
+
+    async def _offload(self, func, *args):
+        if isinstance(self.store, MemoryBackend):
+            return func(*args)
+        return await run_blocking(func, *args)
+
+    def _set(self, token: str, entry: Dict, ttl: int = LLM_CACHE_TTL_SECONDS):
+        try:
+            self._store().set(f"llm:{token}", CachedResponse(json.dumps(entry).encode(), "", time.time()), ttl)
+        except Exception as e:
+            logger.warning(f"Explanation cache write failed for {token}: {str(e)}")
+            record_upstream_error("response_cache")
+
+    def submit(self, symbol: str, shap_dict: Optional[List[Dict]]) -> Optional[str]:
+        """Queue an explanation from any thread; returns its token, or None when no LLM is configured."""
+        if not shap_dict or self._loop is None or self._loop.is_closed():
+            return None
+        token = explanation_token(symbol, shap_dict)
+        with self._lock:
+            # Queued at most once per worker, even if its pending entry was evicted meanwhile
+            if token in self._queued:
+                record_cache("llm_explanation", "coalesced")
+                return token
+            self._queued.add(token)
+        asyncio.run_coroutine_threadsafe(self._enqueue(token, symbol, shap_dict), self._loop)
+        return token
+
+    async def _enqueue(self, token: str, symbol: str, shap_dict: List[Dict]):
+        entry = await self._offload(self._read, token)
+        # Pending entries from other workers count as hits; they are generating the text
+        if entry is not None and entry["status"] != "failed":
+            record_cache("llm_explanation", "hit")
+            with self._lock:
+                self._queued.discard(token)
+            return
+        record_cache("llm_explanation", "miss")
+        await self._offload(self._set, token, {"status": "pending", "explanation": None}, LLM_PENDING_TTL_SECONDS)
+        self._queue.put_nowait((token, symbol, shap_dict))
+
+    def _read(self, token: str) -> Optional[Dict]:
+        try:
+            entry = self._store().get(f"llm:{token}")
+        except Exception as e:
+            logger.warning(f"Explanation cache read failed for {token}: {str(e)}")
+            record_upstream_error("response_cache")
+            return None
+        return json.loads(entry.body) if entry is not None else None
+
+    def get(self, token: str) -> Optional[Dict]:
+        """Blocking on a remote backend; call from a worker thread (sync endpoints run in one)."""
+        entry = self._read(token)
+        if entry is not None:
+            return entry
+        with self._lock:
+            # Submitted here but not yet recorded as pending
+            queued = token in self._queued
+        return {"status": "pending", "explanation": None} if queued else None
+
+    async def _run(self):
+        next_call = 0.0
+        while True:
+            token, symbol, shap_dict = await self._queue.get()
+            delay = next_call - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_call = time.monotonic() + self.interval
+            try:
+                if self._llm is None:
+                    self._llm = create_llm(self.backend)
+                with span("llm_explanation"):
+                    response = await self._llm.ainvoke(build_prompt(symbol, shap_dict))
+                await self._offload(self._set, token, {"status": "ready", "explanation": response.content})
+            except Exception as e:
+                logger.warning(f"LLM explanation failed for {symbol}: {str(e)}")
+                record_upstream_error(self.backend)
+                await self._offload(self._set, token, {"status": "failed", "explanation": None})
+            finally:
+                with self._lock:
+                    self._queued.discard(token)
+
+llm_explainer = ExplanationWorker()
@@ -1,17 +1,38 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response, JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from .predictor import hybrid_predict
-from .utils.sentiment import compute_sentiment
-from .utils.data_loader import fetch_historical
+from .backends import backends, WARM_BACKENDS
+from .scheduler import WarmupScheduler, WARMUP_ENABLED, WARMUP_TRAIN_MODELS, market_timezone
+from .utils.news_cache import news_cache
+from .utils.lexicon import get_lexicon_scorer
+from .utils.data_loader import fetch_historical_many, download_bars
+from .utils.bar_store import get_bars, bar_version
+from .utils.symbols import symbol_registry, SymbolNotFoundError
+from .utils.features import compute_indicator_panel, build_features
+from .model_registry import model_registry
+from .global_model import global_model_store
+from .explain import explain_latest
+from .llm_explainer import llm_explainer
+from .utils.incremental import indicator_store
+from .utils.shared_panel import shared_panel, SHARED_PANEL_REFRESH_SECONDS
+from .utils.watchlists import popular_symbols, sector_symbols, warmup_symbols
+from .utils.simulation import MC_PATHS, simulate_paths, realistic_paths, summarize_paths, forecast_dates
+from .utils.forecast_cache import forecast_cache, FORECAST_MAX_HORIZON
+from .utils.response_cache import response_cache, etag_matches, make_etag, CachedResponse
+from .utils.concurrency import run_blocking, get_http_client, close_http_client, shutdown_executor
+from .utils.metrics import metrics, span, timed, record_cache, record_upstream_error, MetricsMiddleware
+from .utils.profiler import profiler, PROFILER_INTERVAL_MS, PROFILER_MAX_SECONDS, PROFILER_TOKEN
 import logging
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional
-import requests
 import json
 
 logging.basicConfig(level=logging.INFO)
@@ -19,10 +40,92 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Multi-symbol endpoints fetch in parallel and give up on stragglers after the deadline
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+FANOUT_DEADLINE_SECONDS = float(os.getenv("FANOUT_DEADLINE_SECONDS", "8"))
+
+# Largest number of (symbol, horizon) pairs accepted by one batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+MOCK_BASE_PRICES = {'RELIANCE': 2450.0, 'TCS': 3200.0, 'HDFCBANK': 1600.0, 'INFY': 1400.0, 'AXISBANK': 1150.0}
+
+async def warm_symbol(symbol: str, stock_data: Optional[Dict]):
+    """Pre-market warm-up of one symbol: bars, indicator state, news, models and full-horizon forecasts"""
+    if stock_data is None:
+        stock_data = await run_blocking(get_real_stock_data, symbol)
+    if stock_data is None:
+        raise ValueError(f"No price history for {symbol}")
+    hist = stock_data['history']
+    await run_blocking(
+        indicator_store.seed, stock_data['symbol'], hist['Close'].tolist(), hist['Volume'].tolist(),
+        [d.strftime('%Y-%m-%d') for d in hist.index]
+    )
+    sentiment_data = await get_enhanced_sentiment(symbol)
+    await generate_realistic_prediction(symbol, FORECAST_MAX_HORIZON, stock_data, sentiment_data)
+    if WARMUP_TRAIN_MODELS:
+        predictor = await run_blocking(backends.get, "predictor")
+        await run_blocking(predictor.hybrid_predict, symbol, FORECAST_MAX_HORIZON, sentiment_data["score"])
+
+async def publish_shared_panel(symbols: List[str]) -> Dict[str, Dict]:
+    """Bulk-fetch bars for symbols and publish them to the other workers through the shared panel"""
+    data = await run_blocking(get_real_stock_data_bulk, symbols)
+    try:
+        await run_blocking(shared_panel.publish, {symbol: (d['symbol'], d['history']) for symbol, d in data.items()})
+    except Exception as e:
+        logger.warning(f"Failed to publish shared panel: {str(e)}")
+    return data
+
+async def prefetch_warmup(symbols: List[str]) -> Dict[str, Dict]:
+    """
+    Warm-up prefetch. Every worker warms its own in-process caches, but only the shared
+    panel writer bulk-fetches and publishes; the others bulk-fetch just the symbols the
+    panel doesn't hold and leave the rest to be read from the panel by warm_symbol.
+    """
+    if shared_panel.elect():
+        return await publish_shared_panel(symbols)
+    missing = await run_blocking(lambda: [s for s in symbols if shared_panel.history(s) is None])
+    return await run_blocking(get_real_stock_data_bulk, missing) if missing else {}
+
+async def shared_panel_refresh_loop():
+    """Keep the shared panel current from whichever worker holds the writer lock"""
+    while True:
+        await asyncio.sleep(SHARED_PANEL_REFRESH_SECONDS)
+        if shared_panel.elect() and not warmup_scheduler.running:
+            try:
+                await publish_shared_panel(warmup_symbols())
+            except Exception as e:
+                logger.warning(f"Shared panel refresh failed: {str(e)}")
+
+warmup_scheduler = WarmupScheduler(
+    warmup_symbols,
+    prefetch_warmup,
+    warm_symbol
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_BACKENDS:
+        # Load heavy backends in the background so startup isn't held up by them; /ready reports progress
+        asyncio.get_running_loop().run_in_executor(None, backends.warm, WARM_BACKENDS)
+    if WARMUP_ENABLED:
+        warmup_scheduler.start()
+    panel_refresher = asyncio.get_running_loop().create_task(shared_panel_refresh_loop())
+    llm_explainer.start()
+    yield
+    panel_refresher.cancel()
+    await warmup_scheduler.stop()
+    await llm_explainer.stop()
+    await close_http_client()
+    shutdown_executor()
+    if backends.is_loaded("sentiment"):
+        backends.get("sentiment").sentiment_scorer.shutdown()
+    indicator_store.save()
+
 app = FastAPI(
     title="IntelVestor ML Microservice",
     description="API for stock predictions, sentiment, and XAI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -33,131 +136,344 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so latency and in-flight counts cover the whole request
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check():
+    """Ready once the backends listed in WARM_BACKENDS are loaded; reports the state of every backend"""
+    status = backends.status()
+    ready = all(status.get(name, {}).get("state") == "warm" for name in WARM_BACKENDS)
+    body = {"status": "ready" if ready else "warming", "required": WARM_BACKENDS, "backends": status}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics of this worker: stage and request latency, cache hit ratios, upstream errors"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def check_profiler_token(token: Optional[str]):
+    """The profiler endpoints don't exist unless PROFILER_TOKEN is configured"""
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token != PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+@app.post("/ml/profiler/start")
+def profiler_start(interval_ms: float = PROFILER_INTERVAL_MS, duration_seconds: float = PROFILER_MAX_SECONDS,
+                   x_profiler_token: Optional[str] = Header(None)):
+    """
+    Start sampling this worker's stacks; the session ends on stop or after duration_seconds.
+    Sessions are per worker process: with several workers, start, stop and the report may
+    land on different ones, so profile a single worker (or retry until the pid matches).
+    """
+    check_profiler_token(x_profiler_token)
+    started = profiler.start(interval_ms, duration_seconds)
+    return {"started": started, **profiler.status()}
+
+@app.post("/ml/profiler/stop")
+def profiler_stop(x_profiler_token: Optional[str] = Header(None)):
+    check_profiler_token(x_profiler_token)
+    profiler.stop()
+    return {**profiler.status(), "top": profiler.top()}
+
+@app.get("/ml/profiler")
+def profiler_report(format: str = "json", x_profiler_token: Optional[str] = Header(None)):
+    """Samples of the current or last session: top frames as JSON, or format=collapsed for flame graphs"""
+    check_profiler_token(x_profiler_token)
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return {**profiler.status(), "top": profiler.top()}
+
+@app.get("/ml/global-model")
+def global_model_status():
+    """Mode, age and size of the cross-symbol global model"""
+    return global_model_store.status()
+
+@app.post("/ml/global-model/train")
+def global_model_train():
+    """Retrain the global model over every tracked symbol in the background"""
+    global_model_store.schedule_train()
+    return global_model_store.status()
+
+@app.get("/ml/explanations/{token}")
+def get_explanation(token: str):
+    """
+    LLM explanation for a token returned by a prediction; status is pending, ready or failed.
+    Tokens resolve on any worker only with the redis response-cache backend.
+    """
+    entry = llm_explainer.get(token)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired explanation token")
+    return {"token": token, **entry}
+
+@app.get("/ml/warmup/status")
+def warmup_status():
+    """Progress of the current or last pre-market warm-up, and the shared panel it publishes"""
+    return {**warmup_scheduler.status(), "shared_panel": shared_panel.status()}
+
+@app.post("/ml/warmup/run")
+async def warmup_run():
+    """Start a warm-up now; does nothing if one is already running"""
+    started = warmup_scheduler.trigger()
+    return {"started": started, **warmup_scheduler.status()}
+
+def prediction_cache_key(symbol: str, horizon: int) -> Optional[str]:
+    """
+    Response cache key including the latest stored bar and the market day, or None while
+    the symbol has no stored data. Forecast dates count from the day a body was computed,
+    so a body never outlives its day even when no new bar arrives (weekends, holidays).
+    """
+    known, ticker = symbol_registry.lookup(symbol)
+    version = bar_version(ticker) if ticker else None
+    if version is None:
+        return None
+    day = datetime.now(market_timezone()).date().isoformat()
+    return f"predict:{symbol_registry.normalize(symbol)}:{horizon}:{version}:{day}"
+
+def cached_json_response(entry: CachedResponse, if_none_match: Optional[str]) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"max-age={response_cache.ttl}, stale-while-revalidate={response_cache.max_stale}"
+    }
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+async def compute_prediction(symbol: str, horizon: int):
+    """Run the full prediction pipeline; returns (result, whether it is based on real data)"""
+    # Try to get real data first, fetching prices and news sentiment concurrently
+    try:
+        real_data, sentiment_data = await asyncio.gather(
+            run_blocking(get_real_stock_data, symbol),
+            get_enhanced_sentiment(symbol)
+        )
+        if real_data:
+            logger.info(f"Using real stock data for {symbol}")
+            return await generate_realistic_prediction(symbol, horizon, real_data, sentiment_data), True
+    except Exception as e:
+        logger.warning(f"Failed to fetch real data for {symbol}: {str(e)}")
+    
+    # Fall back to mock data with realistic patterns
+    logger.info(f"Using enhanced mock data for {symbol}")
+    return generate_enhanced_mock_data(symbol, horizon), False
+
+async def revalidate_prediction(symbol: str, horizon: int, key: str):
+    """Refresh the bars behind a stale cached prediction and recompute only if they or the day changed"""
+    await run_blocking(get_real_stock_data, symbol)
+    if prediction_cache_key(symbol, horizon) == key:
+        await response_cache.touch_async(key)
+        return
+    result, real = await compute_prediction(symbol, horizon)
+    new_key = prediction_cache_key(symbol, horizon)
+    if real and new_key:
+        await response_cache.store_async(new_key, json.dumps(jsonable_encoder(result)).encode())
+
 @app.post("/ml/predict")
-async def predict(symbol: str, horizon: int = 30):
+async def predict(symbol: str, horizon: int = 30, if_none_match: Optional[str] = Header(None)):
     logger.info(f"Processing prediction request for symbol: {symbol}, horizon: {horizon}")
     try:
         if not symbol or not symbol.strip() or '{' in symbol or '}' in symbol:
             raise ValueError(f"Invalid symbol: {symbol}")
-        if horizon < 1 or horizon > 90:
-            raise ValueError("Horizon must be between 1 and 90 days")
-
-        # Try to get real data first
-        try:
-            real_data = get_real_stock_data(symbol)
-            if real_data:
-                logger.info(f"Using real stock data for {symbol}")
-                return await generate_realistic_prediction(symbol, horizon, real_data)
-        except Exception as e:
-            logger.warning(f"Failed to fetch real data for {symbol}: {str(e)}")
-        
-        # Fall back to mock data with realistic patterns
-        logger.info(f"Using enhanced mock data for {symbol}")
-        return generate_enhanced_mock_data(symbol, horizon)
+        if horizon < 1 or horizon > FORECAST_MAX_HORIZON:
+            raise ValueError(f"Horizon must be between 1 and {FORECAST_MAX_HORIZON} days")
+        # Cached bodies are shared across spellings of the symbol, so build them from the normalized one
+        symbol = symbol_registry.normalize(symbol)
+
+        # Serve repeat views from the response cache; a stale entry is refreshed in the background
+        key = prediction_cache_key(symbol, horizon)
+        if key:
+            entry, stale = await response_cache.lookup_async(key)
+            if entry is not None:
+                if stale:
+                    response_cache.revalidate(key, lambda: revalidate_prediction(symbol, horizon, key))
+                return cached_json_response(entry, if_none_match)
+
+        result, real = await compute_prediction(symbol, horizon)
+        body = json.dumps(jsonable_encoder(result)).encode()
+        # Mock fallbacks aren't cached so real data is picked up as soon as it is available
+        key = prediction_cache_key(symbol, horizon) if real else None
+        entry = await response_cache.store_async(key, body) if key else CachedResponse(body, make_etag(body), 0.0)
+        return cached_json_response(entry, if_none_match)
         
     except Exception as e:
         logger.error(f"Prediction failed for {symbol}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}. Please check symbol or API keys.")
 
+@timed("stock_data")
 def get_real_stock_data(symbol: str) -> Optional[Dict]:
-    """Fetch real stock data using yfinance"""
+    """Fetch real stock data using yfinance, served from the shared panel or the local bar store where possible"""
+    shared = shared_panel.history(symbol)
+    record_cache("shared_panel", "hit" if shared is not None else "miss")
+    if shared is not None:
+        sym, hist, indicators = shared
+        # Panel hits skip resolve(), so record the ticker here for prediction_cache_key
+        symbol_registry.remember(symbol, sym)
+        return {
+            'symbol': sym,
+            'history': hist,
+            'current_price': hist['Close'].iloc[-1],
+            'indicators': indicators
+        }
+    
+    start_date = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+    
+    def probe(sym: str) -> Optional[pd.DataFrame]:
+        hist = get_bars(sym, start_date, download_bars).set_index('Date')
+        return hist if len(hist) > 30 else None
+    
     try:
-        # Try both NSE and BSE formats
-        symbols_to_try = [symbol, f"{symbol}.NS", f"{symbol}.BO"]
-        
-        for sym in symbols_to_try:
-            try:
-                ticker = yf.Ticker(sym)
-                hist = ticker.history(period="1y")
-                info = ticker.info
-                
-                if not hist.empty and len(hist) > 30:
-                    logger.info(f"Successfully fetched data for {sym}")
-                    return {
-                        'symbol': sym,
-                        'history': hist,
-                        'info': info,
-                        'current_price': hist['Close'].iloc[-1]
-                    }
-            except Exception as e:
-                logger.debug(f"Failed to fetch {sym}: {str(e)}")
-                continue
-        
+        # Shared with fetch_historical: NSE/BSE/bare suffix is probed once per TTL
+        sym, hist = symbol_registry.resolve(symbol, probe)
+        logger.info(f"Successfully fetched data for {sym}")
+        return {
+            'symbol': sym,
+            'history': hist,
+            'current_price': hist['Close'].iloc[-1]
+        }
+    except SymbolNotFoundError as e:
+        logger.info(str(e))
         return None
     except Exception as e:
         logger.error(f"Error fetching real stock data: {str(e)}")
         return None
 
-async def generate_realistic_prediction(symbol: str, horizon: int, stock_data: Dict):
+def get_real_stock_data_bulk(symbols: List[str]) -> Dict[str, Dict]:
+    """Fetch a year of bars for many symbols through one bulk download; unavailable symbols are left out"""
+    start_date = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+    results = {}
+    for symbol, (sym, hist) in fetch_historical_many(symbols, start_date).items():
+        hist = hist.set_index('Date')
+        if len(hist) > 30:
+            results[symbol] = {
+                'symbol': sym,
+                'history': hist,
+                'current_price': hist['Close'].iloc[-1]
+            }
+    return results
+
+async def get_real_stock_data_many(symbols: List[str], deadline: float = FANOUT_DEADLINE_SECONDS) -> Dict[str, Dict]:
+    """Fetch several symbols concurrently under one deadline; each entry carries a per-symbol status"""
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    
+    async def fetch_one(sym: str) -> Optional[Dict]:
+        async with semaphore:
+            return await run_blocking(get_real_stock_data, sym)
+    
+    tasks = {sym: asyncio.ensure_future(fetch_one(sym)) for sym in dict.fromkeys(symbols)}
+    if not tasks:
+        return {}
+    _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        # The executor thread keeps going and still fills the bar store for the next request
+        task.cancel()
+    
+    results = {}
+    for sym, task in tasks.items():
+        if task in pending:
+            results[sym] = {"status": "timeout", "data": None}
+        elif task.exception() is not None:
+            logger.warning(f"Error fetching {sym}: {str(task.exception())}")
+            results[sym] = {"status": "error", "data": None}
+        elif task.result() is None:
+            results[sym] = {"status": "unavailable", "data": None}
+        else:
+            results[sym] = {"status": "ok", "data": task.result()}
+    return results
+
+def quote_from_result(symbol: str, result: Dict) -> Dict:
+    """Current price and daily change from a fan-out result, falling back to mock values"""
+    real_data = result.get("data")
+    if real_data:
+        current_price = float(real_data['current_price'])
+        hist = real_data['history']
+        prev_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
+        change = ((current_price - prev_close) / prev_close) * 100
+        volume = int(hist['Volume'].iloc[-1])
+    else:
+        current_price = MOCK_BASE_PRICES.get(symbol, 1000.0)
+        change = np.random.uniform(-3.0, 3.0)
+        volume = np.random.randint(1000000, 5000000)
+    return {
+        "current_price": current_price,
+        "change_percent": change,
+        "volume": volume,
+        "status": result.get("status", "unavailable")
+    }
+
+@timed("realistic_forecast")
+def realistic_forecast(stock_data: Dict, seed: Optional[int] = None, bundle=None) -> Dict:
+    """
+    Full-horizon trajectory with confidence bands, plus SHAP values, from real stock data.
+    With a fitted ensemble bundle at hand the SHAP values are its real XGBoost attributions.
+    CPU bound; async callers run it through run_blocking.
+    """
+    # Indicator columns go on a copy, the caller's (possibly shared) history is left alone
+    hist = stock_data['history'].copy()
+    
+    # Technical indicators: precomputed in the shared panel, otherwise from the shared feature engine
+    indicators = stock_data.get('indicators')
+    if indicators is None:
+        indicators = {name: values[:, 0] for name, values in compute_indicator_panel(hist[['Close']].to_numpy(), hist[['Volume']].to_numpy()).items()}
+    hist['SMA_20'] = indicators['sma_20']
+    hist['SMA_50'] = indicators['sma_50']
+    hist['RSI'] = indicators['rsi_14']
+    hist['Volatility'] = indicators['volatility_20']
+    
+    # Simulate paths from historical trend and volatility; confidence comes from the percentile bands
+    rng = np.random.default_rng(seed)
+    paths = realistic_paths(hist['Close'].to_numpy(), FORECAST_MAX_HORIZON, MC_PATHS, rng)
+    
+    # Real attributions from a warm ensemble, otherwise values derived from the technical indicators
+    shap_values = None
+    if bundle is not None:
+        shap_values = explain_latest(bundle, build_features(hist[['Open', 'High', 'Low', 'Close', 'Volume']]))
+    
+    return {
+        "prediction": summarize_paths(paths, forecast_dates(FORECAST_MAX_HORIZON)),
+        "shap": shap_values or generate_realistic_shap(hist)
+    }
+
+async def generate_realistic_prediction(symbol: str, horizon: int, stock_data: Dict, sentiment_data: Optional[Dict] = None, seed: Optional[int] = None):
     """Generate predictions based on real stock data"""
     try:
-        hist = stock_data['history']
         current_price = float(stock_data['current_price'])
         
-        # Calculate technical indicators
-        hist['SMA_20'] = hist['Close'].rolling(window=20).mean()
-        hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
-        hist['RSI'] = calculate_rsi(hist['Close'])
-        hist['Volatility'] = hist['Close'].pct_change().rolling(window=20).std()
+        # One full-horizon forecast per ticker, bar version and day (the dates start today) serves every horizon
+        # Models already in memory explain the forecast; never trained on this path
+        bundle = model_registry.peek(symbol)
+        version = bar_version(stock_data['symbol'])
+        if version is None or seed is not None:
+            forecast = await run_blocking(realistic_forecast, stock_data, seed, bundle)
+        else:
+            key = ("realistic", stock_data['symbol'], version, date.today().isoformat(), bundle.trained_at if bundle else None)
+            forecast = await run_blocking(forecast_cache.get, key, lambda: realistic_forecast(stock_data, bundle=bundle))
+        predictions = forecast["prediction"][:horizon]
         
-        # Generate predictions based on historical patterns
-        predictions = []
-        base_price = current_price
-        
-        # Calculate trend and volatility
-        recent_trend = (hist['Close'].iloc[-5:].mean() - hist['Close'].iloc[-20:-15].mean()) / hist['Close'].iloc[-20:-15].mean()
-        volatility = hist['Close'].pct_change().std()
-        
-        for i in range(horizon):
-            # Apply trend with decreasing confidence over time
-            trend_factor = recent_trend * (0.95 ** i)  # Trend decreases over time
-            noise = np.random.normal(0, volatility * (1 + i * 0.1))  # Increasing uncertainty
-            
-            price_change = trend_factor + noise
-            base_price = base_price * (1 + price_change)
-            
-            confidence = max(0.5, 0.85 - i * 0.01)  # Decreasing confidence over time
-            
-            predictions.append({
-                "date": (datetime.now() + timedelta(days=i+1)).strftime('%Y-%m-%d'),
-                "pred": round(base_price, 2),
-                "conf": round(confidence, 2)
-            })
-        
-        # Get real news sentiment
-        sentiment_data = await get_enhanced_sentiment(symbol)
-        
-        # Generate SHAP values based on real technical indicators
-        shap_values = generate_realistic_shap(hist)
+        # Get real news sentiment unless the caller already fetched it
+        if sentiment_data is None:
+            sentiment_data = await get_enhanced_sentiment(symbol)
         
         return {
             "symbol": symbol,
             "prediction": predictions,
             "sentiment": sentiment_data,
-            "shap": shap_values,
-            "explanation": f"Prediction for {symbol} based on historical analysis. Current price: ₹{current_price:.2f}. The model considers technical indicators including moving averages, RSI, and recent price trends. Confidence decreases over longer time horizons."
+            "shap": forecast["shap"],
+            # Fetch the LLM-written explanation later from /ml/explanations/{token}
+            "explanation_token": llm_explainer.submit(symbol, forecast["shap"]),
+            "explanation": f"Prediction for {symbol} based on historical analysis. Current price: ₹{current_price:.2f}. The model considers technical indicators including moving averages, RSI, and recent price trends. Confidence reflects the spread of simulated price paths and decreases over longer time horizons."
         }
         
     except Exception as e:
         logger.error(f"Error generating realistic prediction: {str(e)}")
         return generate_enhanced_mock_data(symbol, horizon)
 
-def calculate_rsi(prices, window=14):
-    """Calculate RSI indicator"""
-    delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
-
 def generate_realistic_shap(hist_data):
-    """Generate realistic SHAP values based on actual data"""
+    """SHAP-like feature contributions derived from the latest technical indicators, used when no fitted model is warm"""
     try:
         latest_data = hist_data.iloc[-1]
         
@@ -165,13 +481,16 @@ def generate_realistic_shap(hist_data):
         close_impact = min(0.4, max(0.1, abs(latest_data['Close'] - latest_data['SMA_20']) / latest_data['SMA_20']))
         volume_impact = min(0.3, max(0.05, (latest_data['Volume'] - hist_data['Volume'].mean()) / hist_data['Volume'].std() * 0.1))
         rsi_impact = min(0.2, max(-0.2, (latest_data['RSI'] - 50) / 50 * 0.2))
+        # Short vs long moving average trend, and recent volatility as a drag
+        sma_impact = min(0.15, max(-0.15, np.nan_to_num((latest_data['SMA_20'] - latest_data['SMA_50']) / latest_data['SMA_50'] * 2)))
+        volatility_impact = -min(0.1, float(np.nan_to_num(latest_data['Volatility'])) * 5)
         
         return [
             {"feature": "Close Price", "value": round(close_impact, 3)},
             {"feature": "Volume", "value": round(volume_impact, 3)},
             {"feature": "RSI", "value": round(rsi_impact, 3)},
-            {"feature": "SMA_20", "value": round(np.random.uniform(0.05, 0.15), 3)},
-            {"feature": "Volatility", "value": round(np.random.uniform(-0.1, 0.1), 3)}
+            {"feature": "SMA_20", "value": round(sma_impact, 3)},
+            {"feature": "Volatility", "value": round(volatility_impact, 3)}
         ]
     except:
         return [
@@ -182,6 +501,23 @@ def generate_realistic_shap(hist_data):
             {"feature": "Volatility", "value": 0.08}
         ]
 
+async def fetch_news_articles(symbol: str, news_api_key: str) -> List[Dict[str, str]]:
+    """Fetch the latest NewsAPI articles for a symbol over the shared pooled client"""
+    try:
+        with span("newsapi"):
+            response = await get_http_client().get(
+                "https://newsapi.org/v2/everything",
+                params={"q": symbol, "language": "en", "sortBy": "publishedAt", "pageSize": 10, "apiKey": news_api_key}
+            )
+            response.raise_for_status()
+    except Exception:
+        record_upstream_error("newsapi")
+        raise
+    return [
+        {"title": article['title'], "description": article.get('description') or ''}
+        for article in response.json().get('articles', [])
+    ]
+
 async def get_enhanced_sentiment(symbol: str) -> Dict:
     """Get enhanced sentiment analysis"""
     try:
@@ -190,12 +526,9 @@ async def get_enhanced_sentiment(symbol: str) -> Dict:
         
         if news_api_key:
             try:
-                # Fetch real news
-                url = f"https://newsapi.org/v2/everything?q={symbol}&language=en&sortBy=publishedAt&apiKey={news_api_key}"
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    news_data = response.json()
-                    headlines = [article['title'] for article in news_data.get('articles', [])[:5]]
+                # Fetch real news, shared with other requests for the symbol through the news cache
+                articles = await news_cache.get_async(symbol, lambda: fetch_news_articles(symbol, news_api_key))
+                headlines = [article['title'] for article in articles[:5]]
             except Exception as e:
                 logger.warning(f"Failed to fetch real news: {str(e)}")
         
@@ -237,18 +570,13 @@ def generate_realistic_headlines(symbol: str) -> List[str]:
     return templates
 
 def analyze_headlines_sentiment(headlines: List[str]) -> float:
-    """Simple sentiment analysis of headlines"""
-    positive_words = ['strong', 'growth', 'positive', 'upgrade', 'beats', 'expansion', 'competitive']
-    negative_words = ['decline', 'loss', 'negative', 'downgrade', 'volatility', 'concern']
-    
-    total_score = 0
-    for headline in headlines:
-        headline_lower = headline.lower()
-        pos_count = sum(1 for word in positive_words if word in headline_lower)
-        neg_count = sum(1 for word in negative_words if word in headline_lower)
-        total_score += (pos_count - neg_count) * 0.1
-    
-    return max(-1.0, min(1.0, total_score / len(headlines) if headlines else 0))
+    """Keyword-lexicon sentiment of headlines, scored in one batch"""
+    if not headlines:
+        return 0
+    with span("headline_sentiment"):
+        results = get_lexicon_scorer().score_batch(headlines)
+    total_score = sum(result.score * 0.1 for result in results)
+    return max(-1.0, min(1.0, total_score / len(headlines)))
 
 def generate_mock_sentiment(symbol: str) -> Dict:
     """Generate mock sentiment data"""
@@ -268,31 +596,95 @@ def generate_mock_sentiment(symbol: str) -> Dict:
     }
 
 @app.get("/predict/{symbol}")
-async def predict_get(symbol: str, horizon: int = 30):
+async def predict_get(symbol: str, horizon: int = 30, if_none_match: Optional[str] = Header(None)):
     """Legacy GET endpoint for backward compatibility"""
-    return await predict(symbol, horizon)
+    return await predict(symbol, horizon, if_none_match)
+
+class BatchPredictItem(BaseModel):
+    symbol: str
+    horizon: int = 30
+
+@app.post("/ml/predict/batch")
+async def predict_batch(items: List[BatchPredictItem], model: str = "realistic"):
+    """
+    Predict many (symbol, horizon) pairs in one call, streamed back as NDJSON with one line per symbol.
+    Prices come from one bulk download and each symbol is forecast once at its longest horizon.
+    Use model=hybrid for the trained ensemble instead of the realistic historical model.
+    """
+    if not items or len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch must contain between 1 and {BATCH_MAX_ITEMS} items")
+    if model not in ("realistic", "hybrid"):
+        raise HTTPException(status_code=400, detail=f"Unknown model: {model}")
+    horizons_by_symbol: Dict[str, List[int]] = {}
+    for item in items:
+        symbol = item.symbol.strip()
+        if not symbol or '{' in symbol or '}' in symbol:
+            raise HTTPException(status_code=400, detail=f"Invalid symbol: {item.symbol}")
+        if item.horizon < 1 or item.horizon > FORECAST_MAX_HORIZON:
+            raise HTTPException(status_code=400, detail=f"Horizon must be between 1 and {FORECAST_MAX_HORIZON} days")
+        horizons = horizons_by_symbol.setdefault(symbol, [])
+        if item.horizon not in horizons:
+            horizons.append(item.horizon)
+    
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    
+    async def sentiment_for(symbol: str) -> Dict:
+        async with semaphore:
+            return await get_enhanced_sentiment(symbol)
+    
+    async def realistic_lines():
+        histories = await run_blocking(get_real_stock_data_bulk, list(horizons_by_symbol))
+        
+        async def predict_symbol(symbol: str) -> Dict:
+            horizons = horizons_by_symbol[symbol]
+            try:
+                if symbol in histories:
+                    sentiment_data = await sentiment_for(symbol)
+                    payload = await generate_realistic_prediction(symbol, max(horizons), histories[symbol], sentiment_data)
+                    status = "ok"
+                else:
+                    payload = generate_enhanced_mock_data(symbol, max(horizons))
+                    status = "mock"
+                return {
+                    "symbol": symbol,
+                    "status": status,
+                    "results": {h: {**payload, "prediction": payload["prediction"][:h]} for h in horizons}
+                }
+            except Exception as e:
+                logger.warning(f"Batch prediction failed for {symbol}: {str(e)}")
+                return {"symbol": symbol, "status": "error", "error": str(e)}
+        
+        for next_result in asyncio.as_completed([predict_symbol(symbol) for symbol in horizons_by_symbol]):
+            yield json.dumps(jsonable_encoder(await next_result)) + "\n"
+    
+    async def hybrid_lines():
+        sentiments = await asyncio.gather(*[sentiment_for(symbol) for symbol in horizons_by_symbol])
+        scores = {symbol: data["score"] for symbol, data in zip(horizons_by_symbol, sentiments)}
+        pairs = [(symbol, h) for symbol, horizons in horizons_by_symbol.items() for h in horizons]
+        predictor = await run_blocking(backends.get, "predictor")
+        results = predictor.hybrid_predict_batch(pairs, scores)
+        while True:
+            result = await run_blocking(next, results, None)
+            if result is None:
+                break
+            yield json.dumps(jsonable_encoder(result)) + "\n"
+    
+    lines = hybrid_lines() if model == "hybrid" else realistic_lines()
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 @app.get("/ml/portfolio-analysis")
 async def portfolio_analysis(symbols: str):
     """Analyze portfolio performance"""
     try:
-        symbol_list = symbols.split(',')
+        symbol_list = [symbol.strip() for symbol in symbols.split(',') if symbol.strip()]
         portfolio_data = []
         total_value = 0
         
+        # Get real data for all holdings at once, mock values for the ones that fail
+        results = await get_real_stock_data_many(symbol_list)
         for symbol in symbol_list:
-            symbol = symbol.strip()
-            # Get mock or real data
-            real_data = get_real_stock_data(symbol)
-            if real_data:
-                current_price = float(real_data['current_price'])
-                hist = real_data['history']
-                prev_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
-                change = ((current_price - prev_close) / prev_close) * 100
-            else:
-                base_prices = {'RELIANCE': 2450.0, 'TCS': 3200.0, 'HDFCBANK': 1600.0, 'INFY': 1400.0, 'AXISBANK': 1150.0}
-                current_price = base_prices.get(symbol, 1000.0)
-                change = np.random.uniform(-3.0, 3.0)
+            quote = quote_from_result(symbol, results[symbol])
+            current_price = quote["current_price"]
             
             quantity = np.random.randint(5, 50)  # Mock quantity
             value = current_price * quantity
@@ -303,8 +695,9 @@ async def portfolio_analysis(symbols: str):
                 "current_price": round(current_price, 2),
                 "quantity": quantity,
                 "value": round(value, 2),
-                "change_percent": round(change, 2),
-                "weight": 0  # Will be calculated after total
+                "change_percent": round(quote["change_percent"], 2),
+                "weight": 0,  # Will be calculated after total
+                "status": quote["status"]
             })
         
         # Calculate weights
@@ -341,7 +734,7 @@ async def news_sentiment(symbol: str):
         logger.error(f"News sentiment error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def generate_enhanced_mock_data(symbol: str, horizon: int):
+def generate_enhanced_mock_data(symbol: str, horizon: int, seed: Optional[int] = None):
     """Generate enhanced realistic mock data for demo when real data is unavailable."""
     logger.info(f"Generating enhanced mock data for {symbol}")
     
@@ -360,13 +753,10 @@ def generate_enhanced_mock_data(symbol: str, horizon: int):
     }
     base_price = base_prices.get(symbol, 1000.0)
     
-    # Generate more realistic price movements with market patterns
-    predictions = []
-    current_price = base_price
-    
     # Simulate market conditions
-    market_trend = np.random.choice(['bullish', 'bearish', 'sideways'], p=[0.4, 0.3, 0.3])
-    volatility = np.random.uniform(0.015, 0.035)  # 1.5% to 3.5% daily volatility
+    rng = np.random.default_rng(seed)
+    market_trend = rng.choice(['bullish', 'bearish', 'sideways'], p=[0.4, 0.3, 0.3])
+    volatility = rng.uniform(0.015, 0.035)  # 1.5% to 3.5% daily volatility
     
     trend_bias = {
         'bullish': 0.0008,    # 0.08% daily upward bias
@@ -374,36 +764,22 @@ def generate_enhanced_mock_data(symbol: str, horizon: int):
         'sideways': 0.0001    # Almost neutral
     }
     
-    for i in range(horizon):
-        # Apply trend with random walk
-        daily_return = np.random.normal(trend_bias[market_trend], volatility)
-        current_price = current_price * (1 + daily_return)
-        
-        # Confidence decreases over time and with volatility
-        base_confidence = 0.85
-        time_decay = i * 0.008  # Confidence decreases by 0.8% per day
-        volatility_impact = volatility * 10  # Higher volatility = lower confidence
-        confidence = base_confidence - time_decay - volatility_impact
-        confidence = max(0.45, min(0.92, confidence))
-        
-        predictions.append({
-            "date": (datetime.now() + timedelta(days=i+1)).strftime('%Y-%m-%d'),
-            "pred": round(current_price, 2),
-            "conf": round(confidence, 2)
-        })
+    # Random walk paths with the trend bias, summarised into median and percentile bands
+    paths = simulate_paths(base_price, trend_bias[market_trend], volatility, horizon, MC_PATHS, rng)
+    predictions = summarize_paths(paths, forecast_dates(horizon))
     
     # Generate enhanced sentiment data
     sentiment_data = generate_mock_sentiment(symbol)
     
     # Generate more realistic SHAP values
     shap_values = [
-        {"feature": "Close Price", "value": round(np.random.uniform(0.25, 0.45), 3)},
-        {"feature": "Volume", "value": round(np.random.uniform(0.15, 0.30), 3)},
-        {"feature": "RSI", "value": round(np.random.uniform(0.08, 0.20), 3)},
-        {"feature": "SMA_20", "value": round(np.random.uniform(0.05, 0.18), 3)},
-        {"feature": "MACD", "value": round(np.random.uniform(-0.08, 0.12), 3)},
-        {"feature": "Bollinger Bands", "value": round(np.random.uniform(0.03, 0.10), 3)},
-        {"feature": "Market Sentiment", "value": round(np.random.uniform(-0.05, 0.15), 3)}
+        {"feature": "Close Price", "value": round(rng.uniform(0.25, 0.45), 3)},
+        {"feature": "Volume", "value": round(rng.uniform(0.15, 0.30), 3)},
+        {"feature": "RSI", "value": round(rng.uniform(0.08, 0.20), 3)},
+        {"feature": "SMA_20", "value": round(rng.uniform(0.05, 0.18), 3)},
+        {"feature": "MACD", "value": round(rng.uniform(-0.08, 0.12), 3)},
+        {"feature": "Bollinger Bands", "value": round(rng.uniform(0.03, 0.10), 3)},
+        {"feature": "Market Sentiment", "value": round(rng.uniform(-0.05, 0.15), 3)}
     ]
     
     return {
@@ -419,30 +795,23 @@ def generate_enhanced_mock_data(symbol: str, horizon: int):
 async def market_overview():
     """Get overall market overview with multiple stocks"""
     try:
-        popular_stocks = ['RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'AXISBANK']
+        popular_stocks = popular_symbols()
         market_data = []
         
+        # Try to get real data, fall back to mock per symbol
+        results = await get_real_stock_data_many(popular_stocks)
         for symbol in popular_stocks:
             try:
-                # Try to get real data, fall back to mock
-                real_data = get_real_stock_data(symbol)
-                if real_data:
-                    current_price = float(real_data['current_price'])
-                    hist = real_data['history']
-                    prev_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
-                    change = ((current_price - prev_close) / prev_close) * 100
-                else:
-                    # Mock data
-                    base_prices = {'RELIANCE': 2450.0, 'TCS': 3200.0, 'HDFCBANK': 1600.0, 'INFY': 1400.0, 'AXISBANK': 1150.0}
-                    current_price = base_prices.get(symbol, 1000.0)
-                    change = np.random.uniform(-3.0, 3.0)
+                quote = quote_from_result(symbol, results[symbol])
+                current_price = quote["current_price"]
                 
                 market_data.append({
                     "symbol": symbol,
                     "current_price": round(current_price, 2),
-                    "change_percent": round(change, 2),
-                    "volume": np.random.randint(1000000, 5000000),
-                    "market_cap": round(current_price * np.random.uniform(500, 2000), 2)
+                    "change_percent": round(quote["change_percent"], 2),
+                    "volume": quote["volume"],
+                    "market_cap": round(current_price * np.random.uniform(500, 2000), 2),
+                    "status": quote["status"]
                 })
             except Exception as e:
                 logger.warning(f"Error processing {symbol}: {str(e)}")
@@ -461,33 +830,30 @@ async def market_overview():
 async def sector_analysis(sector: str):
     """Get sector-wise analysis"""
     try:
-        sector_stocks = {
-            "banking": ["HDFCBANK", "AXISBANK", "ICICIBANK", "SBIN"],
-            "it": ["TCS", "INFY", "WIPRO", "HCLTECH"],
-            "auto": ["MARUTI", "TATAMOTORS", "M&M", "BAJAJ-AUTO"],
-            "pharma": ["SUNPHARMA", "DRREDDY", "CIPLA", "DIVISLAB"]
-        }
-        
-        stocks = sector_stocks.get(sector.lower(), ["RELIANCE", "TCS", "HDFCBANK"])
+        stocks = sector_symbols(sector)
         
         sector_data = []
+        results = await get_real_stock_data_many(stocks)
         for symbol in stocks:
-            # Generate mock data for sector analysis
-            base_price = np.random.uniform(500, 3000)
-            change = np.random.uniform(-2.5, 2.5)
+            quote = quote_from_result(symbol, results[symbol])
+            base_price = quote["current_price"]
             
             sector_data.append({
                 "symbol": symbol,
                 "price": round(base_price, 2),
-                "change": round(change, 2),
+                "change": round(quote["change_percent"], 2),
                 "pe_ratio": round(np.random.uniform(15, 35), 1),
-                "market_cap": round(base_price * np.random.uniform(100, 1000), 2)
+                "market_cap": round(base_price * np.random.uniform(100, 1000), 2),
+                "status": quote["status"]
             })
         
+        live_changes = [item["change"] for item in sector_data if item["status"] == "ok"]
+        sector_performance = float(np.mean(live_changes)) if live_changes else np.random.uniform(-1.5, 2.0)
+        
         return {
             "sector": sector,
             "stocks": sector_data,
-            "sector_performance": round(np.random.uniform(-1.5, 2.0), 2),
+            "sector_performance": round(sector_performance, 2),
             "analysis": f"The {sector} sector shows mixed performance with overall sentiment being cautiously optimistic."
         }
     except Exception as e:
@@ -0,0 +1,209 @@
+import os
+import json
+import pickle
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import pandas as pd
+from .utils.metrics import record_cache, span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join("data", "models"))
+# Fitted bundles kept in memory; each holds four models, the LSTM being the largest
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "16"))
+# Bundles older than this are retrained even if no new bars arrived
+MODEL_MAX_AGE_HOURS = float(os.getenv("MODEL_MAX_AGE_HOURS", "24"))
+# Threads for background retrains of stale bundles
+MODEL_TRAIN_WORKERS = int(os.getenv("MODEL_TRAIN_WORKERS", "1"))
+# Threads for first-time trains a request is waiting on, kept apart so they never queue behind retrains
+MODEL_COLD_TRAIN_WORKERS = int(os.getenv("MODEL_COLD_TRAIN_WORKERS", "2"))
+# Bump when the bundle layout or training recipe changes so old files are ignored
+MODEL_FORMAT_VERSION = 2
+
+def data_version(df: pd.DataFrame) -> str:
+    """Identify the training data by its last bar date and row count."""
+    return f"{pd.Timestamp(df['Date'].iloc[-1]):%Y%m%d}-{len(df)}"
+
+@dataclass
+class ModelBundle:
+    """The four fitted ensemble members for one symbol and data version."""
+    symbol: str
+    version: str
+    features: List[str]
+    scaler: Any
+    arima: Any
+    prophet: Any
+    xgb: Any
+    lstm: Any
+    trained_at: datetime = field(default_factory=datetime.now)
+    fit_seconds: Dict[str, float] = field(default_factory=dict)
+    # Drift reference and update count from app.drift.training_stats; empty for bundles from older releases
+    stats: Dict[str, Any] = field(default_factory=dict)
+    # SHAP explainer for xgb, built on first use and never persisted
+    explainer: Any = field(default=None, repr=False, compare=False)
+
+    def is_expired(self, max_age_hours: float = MODEL_MAX_AGE_HOURS) -> bool:
+        return datetime.now() - self.trained_at > timedelta(hours=max_age_hours)
+
+# train_fn(symbol, featured frame, previous bundle or None) -> fitted bundle
+TrainFn = Callable[[str, pd.DataFrame, Optional[ModelBundle]], ModelBundle]
+
+class ModelRegistry:
+    """
+    Disk-backed registry of fitted model bundles keyed by symbol and data version,
+    with an LRU bound on how many bundles stay loaded in memory.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, capacity: int = MODEL_CACHE_SIZE, max_age_hours: float = MODEL_MAX_AGE_HOURS):
+        self.model_dir = model_dir
+        self.capacity = capacity
+        self.max_age_hours = max_age_hours
+        self._bundles: "OrderedDict[str, ModelBundle]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._training: Dict[str, Any] = {}
+        self._trainer = ThreadPoolExecutor(max_workers=MODEL_TRAIN_WORKERS, thread_name_prefix="model-train")
+        self._cold_trainer = ThreadPoolExecutor(max_workers=MODEL_COLD_TRAIN_WORKERS, thread_name_prefix="model-cold-train")
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.model_dir, symbol.replace('/', '_').replace('\\', '_'))
+
+    def _remember(self, bundle: ModelBundle):
+        with self._lock:
+            self._bundles[bundle.symbol] = bundle
+            self._bundles.move_to_end(bundle.symbol)
+            while len(self._bundles) > self.capacity:
+                evicted, _ = self._bundles.popitem(last=False)
+                logger.info(f"Evicted models for {evicted} from memory")
+
+    def save(self, bundle: ModelBundle):
+        """Persist a bundle, replacing whatever version was stored for the symbol."""
+        final_path = self._path(bundle.symbol)
+        tmp_path = final_path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        bundle.lstm.save(os.path.join(tmp_path, 'lstm.keras'))
+        # Prophet models don't pickle reliably across stan backends, use its own JSON format
+        from prophet.serialize import model_to_json
+        with open(os.path.join(tmp_path, 'prophet.json'), 'w') as f:
+            f.write(model_to_json(bundle.prophet))
+        with open(os.path.join(tmp_path, 'models.pkl'), 'wb') as f:
+            pickle.dump({'scaler': bundle.scaler, 'arima': bundle.arima, 'xgb': bundle.xgb}, f)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'format': MODEL_FORMAT_VERSION,
+                'symbol': bundle.symbol,
+                'version': bundle.version,
+                'features': bundle.features,
+                'trained_at': bundle.trained_at.isoformat(),
+                'fit_seconds': bundle.fit_seconds,
+                'stats': bundle.stats
+            }, f)
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(tmp_path, final_path)
+
+    def load(self, symbol: str) -> Optional[ModelBundle]:
+        """Load the stored bundle for a symbol from disk, or None if missing or outdated."""
+        path = self._path(symbol)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('format') != MODEL_FORMAT_VERSION:
+                logger.info(f"Ignoring stored models for {symbol} in format {meta.get('format')}")
+                return None
+            from keras.models import load_model
+            from prophet.serialize import model_from_json
+            with open(os.path.join(path, 'models.pkl'), 'rb') as f:
+                members = pickle.load(f)
+            with open(os.path.join(path, 'prophet.json')) as f:
+                members['prophet'] = model_from_json(f.read())
+            return ModelBundle(
+                symbol=symbol,
+                version=meta['version'],
+                features=meta['features'],
+                lstm=load_model(os.path.join(path, 'lstm.keras'), compile=False),
+                trained_at=datetime.fromisoformat(meta['trained_at']),
+                fit_seconds=meta.get('fit_seconds', {}),
+                stats=meta.get('stats', {}),
+                **members
+            )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to load stored models for {symbol}: {str(e)}")
+            return None
+
+    def peek(self, symbol: str) -> Optional[ModelBundle]:
+        """Return the bundle for a symbol if it is already in memory, without touching disk."""
+        with self._lock:
+            return self._bundles.get(symbol)
+
+    def _train(self, symbol: str, df: pd.DataFrame, train_fn: TrainFn, previous: Optional[ModelBundle] = None) -> ModelBundle:
+        logger.info(f"Training models for {symbol} on data version {data_version(df)}")
+        bundle = train_fn(symbol, df, previous)
+        self._remember(bundle)
+        try:
+            self.save(bundle)
+        except Exception as e:
+            logger.warning(f"Failed to persist models for {symbol}: {str(e)}")
+        return bundle
+
+    def schedule_retrain(self, symbol: str, df: pd.DataFrame, train_fn: TrainFn, previous: Optional[ModelBundle] = None,
+                         cold: bool = False):
+        """
+        Retrain in the background unless a retrain for the symbol is already running.
+        Cold trains, which a caller is blocked on, run on their own pool; a retrain of the
+        same symbol still waiting in the background queue is pulled forward onto it.
+        """
+        with self._lock:
+            existing = self._training.get(symbol)
+            if existing is not None and not (cold and existing.cancel()):
+                return existing
+            executor = self._cold_trainer if cold else self._trainer
+            future = executor.submit(self._train, symbol, df, train_fn, previous)
+            self._training[symbol] = future
+
+        def done(fut):
+            with self._lock:
+                if self._training.get(symbol) is fut:
+                    del self._training[symbol]
+            if not fut.cancelled() and fut.exception() is not None:
+                logger.error(f"Background retrain failed for {symbol}: {str(fut.exception())}")
+        future.add_done_callback(done)
+        return future
+
+    def get(self, symbol: str, df: pd.DataFrame, train_fn: TrainFn) -> ModelBundle:
+        """
+        Return fitted models for a symbol. A bundle trained on older bars or past its
+        max age is still served while a background retrain runs, which is handed the
+        served bundle to update incrementally. A symbol with no usable bundle at all
+        blocks until it is trained on the cold-train pool, sharing one training run
+        between concurrent callers.
+        """
+        with self._lock:
+            bundle = self._bundles.get(symbol)
+            if bundle is not None:
+                self._bundles.move_to_end(symbol)
+        if bundle is not None:
+            record_cache("model", "hit")
+        else:
+            with span("model_load"):
+                bundle = self.load(symbol)
+            if bundle is not None:
+                record_cache("model", "disk")
+                self._remember(bundle)
+
+        if bundle is None:
+            record_cache("model", "miss")
+            return self.schedule_retrain(symbol, df, train_fn, cold=True).result()
+        if bundle.version != data_version(df) or bundle.is_expired(self.max_age_hours):
+            self.schedule_retrain(symbol, df, train_fn, bundle)
+        return bundle
+
+model_registry = ModelRegistry()
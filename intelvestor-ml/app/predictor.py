@@ -1,97 +1,291 @@
+import time
+import logging
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from statsmodels.tsa.arima.model import ARIMA
-from prophet import Prophet
-from xgboost import XGBRegressor
-from keras.models import Sequential
-from keras.layers import LSTM, Dense
-from sklearn.preprocessing import MinMaxScaler
-import shap
-from langchain_google_genai import ChatGoogleGenerativeAI
-from .utils.data_loader import fetch_historical
-from .utils.features import build_features
+from typing import Dict, Iterator, List, Optional, Tuple
+from .utils.data_loader import fetch_historical, fetch_historical_many
+from .utils.features import build_features, build_feature_panel
+from .utils.forecast_cache import forecast_cache, FORECAST_MAX_HORIZON
+from .utils.metrics import timed
+from .utils.windowing import latest_window
+from .model_registry import model_registry, ModelBundle, data_version
+from .ensemble import fit_members, update_members
+from .drift import refit_reason, training_stats
+from .global_model import global_model_store, HYBRID_MODE
+from .explain import explain_rows
+from .llm_explainer import llm_explainer, template_explanation
 
-def hybrid_predict(symbol: str, horizon: int, sentiment_score: float, google_api_key: str):
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FEATURES = ['Open', 'High', 'Low', 'Volume', 'sma_20', 'sma_50', 'rsi_14', 'macd', 'bb_upper', 'bb_lower', 'volume_sma_20']
+# Features in price units, moved with the predicted close when a recursive LSTM rolls its window forward
+PRICE_FEATURES = ['Open', 'High', 'Low', 'sma_20', 'sma_50', 'macd', 'bb_upper', 'bb_lower']
+
+def train_models(symbol: str, df: pd.DataFrame, previous: Optional[ModelBundle] = None) -> ModelBundle:
     """
-    Generate hybrid predictions, SHAP, and Gemini explanation. Enhanced confidence: variance + sentiment adjustment.
+    Fit the four ensemble members (ARIMA, Prophet, XGBoost, LSTM) on a featured frame.
+    With the previous bundle for the symbol, only update it for the new bars unless
+    drift or the number of updates since its last full fit calls for a refit.
     """
-    # Load and feature data
-    df = fetch_historical(symbol)
-    df = build_features(df)
-    
-    features = ['Open', 'High', 'Low', 'Volume', 'sma_20', 'sma_50', 'rsi_14', 'macd', 'bb_upper', 'bb_lower', 'volume_sma_20']
-    X = df[features]
-    y = df['Close']
-    
+    if previous is not None:
+        reason = refit_reason(previous, df, FEATURES)
+        if reason is None:
+            return update_models(previous, df)
+        logger.info(f"Full refit for {symbol}: {reason}")
+    return fit_models(symbol, df)
+
+@timed("model_fit")
+def fit_models(symbol: str, df: pd.DataFrame) -> ModelBundle:
+    from sklearn.preprocessing import MinMaxScaler
     scaler = MinMaxScaler()
-    X_scaled = scaler.fit_transform(X)
+    X_scaled = scaler.fit_transform(df[FEATURES])
     
-    # ARIMA
-    arima_model = ARIMA(y, order=(5,1,0)).fit()
-    arima_pred = arima_model.forecast(steps=horizon)
+    members, timings = fit_members(df, FEATURES, X_scaled)
     
-    # Prophet
-    prophet_df = df[['Date', 'Close']].rename(columns={'Date': 'ds', 'Close': 'y'})
-    prophet_model = Prophet(daily_seasonality=True)
-    prophet_model.fit(prophet_df)
-    future_df = prophet_model.make_future_dataframe(periods=horizon)
-    prophet_pred = prophet_model.predict(future_df)['yhat'][-horizon:]
+    return ModelBundle(
+        symbol=symbol,
+        version=data_version(df),
+        features=list(FEATURES),
+        scaler=scaler,
+        fit_seconds=timings,
+        stats=training_stats(df, FEATURES),
+        **members
+    )
+
+@timed("model_update")
+def update_models(previous: ModelBundle, df: pd.DataFrame) -> ModelBundle:
+    """A new bundle with the previous members warm-started on df; the previous bundle is left untouched."""
+    X_scaled = previous.scaler.transform(df[FEATURES])
+    members, timings = update_members(
+        {'arima': previous.arima, 'prophet': previous.prophet, 'xgb': previous.xgb, 'lstm': previous.lstm},
+        df, FEATURES, X_scaled
+    )
+    return ModelBundle(
+        symbol=previous.symbol,
+        version=data_version(df),
+        features=list(FEATURES),
+        scaler=previous.scaler,
+        fit_seconds=timings,
+        stats=training_stats(df, FEATURES, previous.stats.get("updates", 0) + 1, previous.stats),
+        **members
+    )
+
+@timed("ensemble_predict")
+def predict_members(bundle: ModelBundle, df: pd.DataFrame, horizon: int, sentiment_score: float,
+                    timings: Optional[Dict[str, float]] = None):
+    """
+    Forecast `horizon` days past the last row of df with each member of a fitted bundle.
+    Returns the stacked member forecasts and the future feature rows fed to XGBoost.
+    If a timings dict is given, the seconds each member spent predicting are added to it.
+    """
+    if not 1 <= horizon <= FORECAST_MAX_HORIZON:
+        # Direct-mode LSTMs only output FORECAST_MAX_HORIZON steps
+        raise ValueError(f"Horizon must be between 1 and {FORECAST_MAX_HORIZON} days")
+    features = bundle.features
+    timings = timings if timings is not None else {}
     
-    # XGBoost
-    xgb_model = XGBRegressor(n_estimators=100, random_state=42)
-    xgb_model.fit(X, y)  # Use unscaled for XGBoost (tree-based)
+    # ARIMA: re-apply the fitted parameters if bars arrived after training, no refit
+    started = time.perf_counter()
+    arima_model = bundle.arima
+    if bundle.version != data_version(df):
+        arima_model = arima_model.apply(df['Close'])
+    arima_pred = arima_model.forecast(steps=horizon)
+    timings['arima'] = time.perf_counter() - started
     
-    # LSTM
-    X_lstm = X_scaled.reshape((X_scaled.shape[0], 1, X_scaled.shape[1]))
-    lstm_model = Sequential([
-        LSTM(50, return_sequences=True, input_shape=(1, X_scaled.shape[1])),
-        LSTM(50),
-        Dense(1)
-    ])
-    lstm_model.compile(optimizer='adam', loss='mse')
-    lstm_model.fit(X_lstm, y, epochs=10, batch_size=32, verbose=0)
+    # Prophet: forecast the days following the latest bar
+    started = time.perf_counter()
+    last_date = df['Date'].iloc[-1]
+    future_df = pd.DataFrame({'ds': [last_date + timedelta(days=i+1) for i in range(horizon)]})
+    prophet_pred = bundle.prophet.predict(future_df)['yhat']
+    timings['prophet'] = time.perf_counter() - started
     
     # Future features (extrapolate with sentiment adjustment)
     last_features = df[features].iloc[-1].values
     future_features = np.tile(last_features, (horizon, 1))
     future_features[:, -1] += sentiment_score * 0.05  # Adjust volume MA as sentiment proxy (realistic tweak)
-    future_scaled = scaler.transform(future_features)
     
     # Predictions
-    xgb_pred = xgb_model.predict(future_features)
-    future_lstm = future_scaled.reshape((horizon, 1, future_scaled.shape[1]))
-    lstm_pred = lstm_model.predict(future_lstm).flatten()
+    started = time.perf_counter()
+    xgb_pred = bundle.xgb.predict(future_features)
+    timings['xgb'] = time.perf_counter() - started
+    started = time.perf_counter()
+    lstm_pred = lstm_forecast(bundle, df, horizon)
+    timings['lstm'] = time.perf_counter() - started
     
-    # Ensemble
-    all_preds = np.vstack([arima_pred, prophet_pred, xgb_pred, lstm_pred])
+    all_preds = np.vstack([np.asarray(arima_pred), np.asarray(prophet_pred), xgb_pred, lstm_pred])
+    return all_preds, future_features
+
+def lstm_forecast(bundle: ModelBundle, df: pd.DataFrame, horizon: int) -> np.ndarray:
+    """
+    The LSTM's forecast of the next `horizon` closes from the last lookback rows of df.
+    A direct model outputs every step at once. A recursive (one-step) model is rolled
+    forward: each predicted close is appended as a new row that carries the last row's
+    features, with the price-level ones scaled by the predicted move.
+    """
+    features = bundle.features
+    lookback, steps = bundle.lstm.input_shape[1], bundle.lstm.output_shape[-1]
+    last_close = float(df['Close'].iloc[-1])
+    if steps > 1:
+        if horizon > steps:
+            raise ValueError(f"The direct LSTM forecasts at most {steps} days, {horizon} requested")
+        window = latest_window(bundle.scaler.transform(df[features].iloc[-lookback:]), lookback)
+        ratios = bundle.lstm.predict(window, verbose=0)[0]
+        return last_close * (1 + ratios[:horizon])
+
+    rows = df[features].iloc[-lookback:].copy()
+    moves_with_price = rows.columns.isin(PRICE_FEATURES)
+    closes = []
+    for _ in range(horizon):
+        window = latest_window(bundle.scaler.transform(rows), lookback)
+        ratio = float(bundle.lstm.predict(window, verbose=0)[0, 0])
+        next_row = rows.iloc[-1].to_numpy(dtype='float64')
+        next_row[moves_with_price] *= 1 + ratio
+        rows = pd.concat([rows.iloc[1:], pd.DataFrame([next_row], columns=features)])
+        last_close *= 1 + ratio
+        closes.append(last_close)
+    return np.array(closes)
+
+def ensemble_predictions(all_preds: np.ndarray, last_date, sentiment_score: float) -> List[Dict]:
+    """Daily ensemble predictions from stacked member forecasts, dated from the day after the last bar."""
     ensemble_preds = np.mean(all_preds, axis=0)
     variance = np.std(all_preds, axis=0)
     confs = 1 - (variance / ensemble_preds) + (sentiment_score * 0.1)  # Enhanced conf: variance + sentiment boost (-1 to 1 normalized)
     confs = np.clip(confs, 0, 1)  # Normalize 0-1
     
-    last_date = df['Date'].iloc[-1]
-    future_dates = [last_date + timedelta(days=i+1) for i in range(horizon)]
-    predictions = [
+    future_dates = [last_date + timedelta(days=i+1) for i in range(all_preds.shape[1])]
+    return [
         {"date": d.strftime('%Y-%m-%d'), "pred": round(float(p), 2), "conf": round(float(c), 2)}
         for d, p, c in zip(future_dates, ensemble_preds, confs)
     ]
+
+def forecast_full(symbol: str, bundle: ModelBundle, df: pd.DataFrame, sentiment_score: float) -> tuple:
+    """
+    Ensemble forecast out to FORECAST_MAX_HORIZON with SHAP values and explanation.
+    """
+    all_preds, future_features = predict_members(bundle, df, FORECAST_MAX_HORIZON, sentiment_score)
+    predictions = ensemble_predictions(all_preds, df['Date'].iloc[-1], sentiment_score)
+    
+    # SHAP on XGBoost, through the explainer kept on the bundle
+    shap_dict = explain_rows(bundle, future_features[-1:])[0]
+    
+    # Instant template explanation; the LLM text is generated off the request path
+    explanation = template_explanation(symbol, shap_dict)
+    
+    return predictions, shap_dict, explanation
+
+def predict_frame(symbol: str, df: pd.DataFrame, horizons: List[int], sentiment_score: float) -> Dict[int, tuple]:
+    """
+    Serve the requested horizons as slices of one full-horizon forecast per symbol, data
+    version, fitted bundle and sentiment. Every step of the forecast is independent of
+    the total horizon, so a slice is identical to a separate run at that horizon.
+    """
+    if HYBRID_MODE == "global":
+        forecasts = global_predict_frames({symbol: df}, {symbol: horizons}, {symbol: sentiment_score})
+        if symbol not in forecasts:
+            raise ValueError(f"Not enough history for {symbol}")
+        return forecasts[symbol]
+    bundle = model_registry.get(symbol, df, train_models)
+    key = ("hybrid", symbol, data_version(df), bundle.trained_at, round(sentiment_score, 2))
+    predictions, shap_dict, explanation = forecast_cache.get(
+        key, lambda: forecast_full(symbol, bundle, df, sentiment_score)
+    )
+    return {h: (predictions[:h], shap_dict, explanation) for h in horizons}
+
+def global_predict_frames(frames: Dict[str, pd.DataFrame], horizons_by_symbol: Dict[str, List[int]],
+                          sentiment_scores: Dict[str, float]) -> Dict[str, Dict[int, tuple]]:
+    """
+    predict_frame for many symbols through the global model: every symbol not in the
+    forecast cache is forecast by one batched call per member. Symbols with too little
+    history for the model's lookback are left out.
+    """
+    model = global_model_store.get()
+    keys = {
+        symbol: ("global", symbol, data_version(df), model.trained_at, round(sentiment_scores.get(symbol, 0.0), 2))
+        for symbol, df in frames.items() if len(df) >= model.lookback
+    }
+    symbol_of = {key: symbol for symbol, key in keys.items()}
     
-    # SHAP on XGBoost
-    explainer = shap.TreeExplainer(xgb_model)
-    shap_values = explainer.shap_values(future_features[-1:])
-    shap_dict = [{"feature": f, "value": round(float(v), 4)} for f, v in zip(features, shap_values[0])]
+    def compute(missing: list) -> Dict:
+        forecasts = model.forecast({symbol_of[key]: frames[symbol_of[key]] for key in missing})
+        results = {}
+        for key in missing:
+            symbol, forecast = symbol_of[key], forecasts[symbol_of[key]]
+            predictions = ensemble_predictions(forecast["members"], forecast["last_date"], sentiment_scores.get(symbol, 0.0))
+            results[key] = (predictions, forecast["shap"], template_explanation(symbol, forecast["shap"]))
+        return results
     
-    # Gemini explanation (enhanced prompt for better output)
-    try:
-        if not google_api_key:
-            explanation = f"Stock prediction for {symbol}: The model considers various technical indicators. Higher values indicate stronger positive impact on price prediction."
-        else:
-            llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=google_api_key)
-            prompt = f"Explain these SHAP values for {symbol} stock prediction in simple English. Make it engaging and easy to understand, like talking to a beginner investor. SHAP values: {shap_dict}"
-            response = llm.invoke(prompt)
-            explanation = response.content
-    except Exception as e:
-        explanation = f"Stock prediction for {symbol}: The model analyzes technical indicators to predict future prices. Error generating detailed explanation: {str(e)}"
+    cached = forecast_cache.get_many(list(keys.values()), compute)
+    return {
+        symbol: {h: (cached[key][0][:h], cached[key][1], cached[key][2]) for h in horizons_by_symbol[symbol]}
+        for symbol, key in keys.items()
+    }
+
+def hybrid_predict(symbol: str, horizon: int, sentiment_score: float, google_api_key: Optional[str] = None):
+    """
+    Generate hybrid predictions, SHAP, a template explanation and the token to fetch the LLM
+    explanation with from /ml/explanations/{token}. Enhanced confidence: variance + sentiment adjustment.
+    Fitted models come from the model registry and are only retrained when new bars arrive or they go stale.
+    With HYBRID_MODE=global they come from the one model shared by all symbols instead.
+    google_api_key is deprecated and ignored; the explanation worker reads GOOGLE_API_KEY itself.
+    """
+    # Load and feature data
+    df = fetch_historical(symbol)
+    df = build_features(df)
+    
+    predictions, shap_dict, explanation = predict_frame(symbol, df, [horizon], sentiment_score)[horizon]
+    return predictions, shap_dict, explanation, llm_explainer.submit(symbol, shap_dict)
+
+def hybrid_predict_batch(requests: List[Tuple[str, int]], sentiment_scores: Optional[Dict[str, float]] = None,
+                         google_api_key: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Batch form of hybrid_predict for many (symbol, horizon) pairs.
+
+    Bars for all symbols come from one bulk download and are featured together in one
+    vectorized panel pass, each symbol's models run once at
+    its longest horizon, and one result dict is yielded per symbol as soon as it is done:
+    {"symbol", "status": "ok", "results": {horizon: {"prediction", "shap", "explanation", "explanation_token"}}}
+    or {"symbol", "status": "error", "error"}. google_api_key is deprecated and ignored.
+    """
+    sentiment_scores = sentiment_scores or {}
+    horizons_by_symbol: Dict[str, List[int]] = {}
+    for symbol, horizon in requests:
+        horizons_by_symbol.setdefault(symbol, [])
+        if horizon not in horizons_by_symbol[symbol]:
+            horizons_by_symbol[symbol].append(horizon)
     
-    return predictions, shap_dict, explanation
\ No newline at end of file
+    histories = fetch_historical_many(list(horizons_by_symbol))
+    featured = build_feature_panel({symbol: df for symbol, (_, df) in histories.items()})
+    global_forecasts = None
+    if HYBRID_MODE == "global":
+        # The whole batch goes through the global model's batched predict at once
+        try:
+            global_forecasts = global_predict_frames(featured, horizons_by_symbol, sentiment_scores)
+        except Exception as e:
+            for symbol in horizons_by_symbol:
+                yield {"symbol": symbol, "status": "error", "error": str(e)}
+            return
+    for symbol, horizons in horizons_by_symbol.items():
+        if symbol not in featured:
+            yield {"symbol": symbol, "status": "error", "error": f"No price history for {symbol}"}
+            continue
+        try:
+            if global_forecasts is not None:
+                if symbol not in global_forecasts:
+                    raise ValueError(f"Not enough history for {symbol}")
+                forecasts = global_forecasts[symbol]
+            else:
+                forecasts = predict_frame(symbol, featured[symbol], horizons, sentiment_scores.get(symbol, 0.0))
+            # Same SHAP vector for every horizon; re-queued only if its text was evicted or failed
+            token = llm_explainer.submit(symbol, next(iter(forecasts.values()))[1])
+            yield {
+                "symbol": symbol,
+                "status": "ok",
+                "results": {
+                    h: {"prediction": predictions, "shap": shap_dict, "explanation": explanation, "explanation_token": token}
+                    for h, (predictions, shap_dict, explanation) in forecasts.items()
+                }
+            }
+        except Exception as e:
+            yield {"symbol": symbol, "status": "error", "error": str(e)}
@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Run the pre-market warm-up inside this process
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# Local market time (HH:MM) the warm-up starts at; it has to finish before the 09:15 open
+WARMUP_TIME = os.getenv("WARMUP_TIME", "08:30")
+# Symbols warmed in parallel
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# Also fit or refresh the hybrid ensemble for every symbol (CPU heavy)
+WARMUP_TRAIN_MODELS = os.getenv("WARMUP_TRAIN_MODELS", "0") == "1"
+MARKET_TIMEZONE = os.getenv("MARKET_TIMEZONE", "Asia/Kolkata")
+
+def market_timezone():
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(MARKET_TIMEZONE)
+    except Exception:
+        # No tz database in the image; IST has no DST so a fixed offset is exact
+        return timezone(timedelta(hours=5, minutes=30), "IST")
+
+def next_run_after(now: datetime, run_at: str = WARMUP_TIME) -> datetime:
+    """The next weekday at run_at in now's timezone, strictly after now."""
+    hour, minute = (int(part) for part in run_at.split(':'))
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return candidate
+
+class WarmupScheduler:
+    """
+    Pre-market warm-up of the configured symbols.
+
+    Once per weekday at WARMUP_TIME (market time) every symbol from `symbols()` is
+    prefetched in one bulk call, then `warm(symbol, data)` runs for each of them with at
+    most `concurrency` in flight. Progress and per-symbol outcomes of the current or
+    last run are reported by status().
+    """
+
+    def __init__(self, symbols: Callable[[], List[str]], prefetch: Callable[[List[str]], Awaitable[Dict]],
+                 warm: Callable[[str, Optional[Dict]], Awaitable[None]], concurrency: int = WARMUP_CONCURRENCY,
+                 run_at: str = WARMUP_TIME):
+        self.symbols = symbols
+        self.prefetch = prefetch
+        self.warm = warm
+        self.concurrency = concurrency
+        self.run_at = run_at
+        self.tz = market_timezone()
+        self._task: Optional[asyncio.Task] = None
+        self._run: Optional[asyncio.Task] = None
+        self._status: Dict = {"state": "idle", "last_run": None}
+        self._next_run: Optional[datetime] = None
+
+    def status(self) -> Dict:
+        status = dict(self._status)
+        status["scheduled"] = self._task is not None and not self._task.done()
+        status["next_run"] = self._next_run.isoformat() if self._next_run else None
+        return status
+
+    @property
+    def running(self) -> bool:
+        return self._run is not None and not self._run.done()
+
+    def trigger(self) -> bool:
+        """Start a run now unless one is in progress; returns whether a run was started."""
+        if self.running:
+            return False
+        self._run = asyncio.get_running_loop().create_task(self.run_once())
+        return True
+
+    async def run_once(self):
+        symbols = self.symbols()
+        started = time.monotonic()
+        progress = {"total": len(symbols), "done": 0, "failed": 0}
+        errors: Dict[str, str] = {}
+        self._status = {
+            "state": "running",
+            "step": "prefetch",
+            "started_at": datetime.now(self.tz).isoformat(),
+            "progress": progress,
+            "errors": errors,
+            "last_run": self._status.get("last_run")
+        }
+        logger.info(f"Warm-up started for {len(symbols)} symbols")
+
+        try:
+            data = await self.prefetch(symbols)
+        except Exception as e:
+            logger.warning(f"Warm-up prefetch failed, warming symbols individually: {str(e)}")
+            data = {}
+
+        self._status["step"] = "warm"
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm_one(symbol: str):
+            async with semaphore:
+                try:
+                    await self.warm(symbol, data.get(symbol))
+                    progress["done"] += 1
+                except Exception as e:
+                    logger.warning(f"Warm-up failed for {symbol}: {str(e)}")
+                    errors[symbol] = str(e)
+                    progress["failed"] += 1
+
+        await asyncio.gather(*[warm_one(symbol) for symbol in symbols])
+        elapsed = round(time.monotonic() - started, 2)
+        self._status.update({
+            "state": "idle",
+            "step": None,
+            "elapsed_seconds": elapsed,
+            "last_run": datetime.now(self.tz).isoformat()
+        })
+        logger.info(f"Warm-up finished in {elapsed}s: {progress['done']} warmed, {progress['failed']} failed")
+
+    async def _loop(self):
+        while True:
+            self._next_run = next_run_after(datetime.now(self.tz), self.run_at)
+            await asyncio.sleep((self._next_run - datetime.now(self.tz)).total_seconds())
+            if not self.trigger():
+                continue
+            try:
+                await self._run
+            except Exception as e:
+                logger.error(f"Warm-up run failed: {str(e)}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        for task in (self._task, self._run):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
@@ -0,0 +1,171 @@
+import os
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", os.path.join("data", "bars"))
+# Minimum time between two upstream refreshes of the same symbol
+BAR_REFRESH_SECONDS = int(os.getenv("BAR_REFRESH_SECONDS", "900"))
+# Gap tolerated at the start of the requested range (weekends, holidays) before backfilling
+BACKFILL_TOLERANCE_DAYS = 7
+
+BAR_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def _symbol_lock(symbol: str) -> threading.Lock:
+    with _locks_guard:
+        if symbol not in _locks:
+            _locks[symbol] = threading.Lock()
+        return _locks[symbol]
+
+def _file_stem(symbol: str) -> str:
+    return os.path.join(BAR_STORE_DIR, symbol.replace('/', '_').replace('\\', '_'))
+
+def normalize_bars(df: pd.DataFrame) -> pd.DataFrame:
+    """Bring a yfinance frame to the stored layout: tz-naive Date column plus OHLCV, sorted and unique."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+    df = df.reset_index() if 'Date' not in df.columns else df
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    if 'Datetime' in df.columns and 'Date' not in df.columns:
+        df = df.rename(columns={'Datetime': 'Date'})
+    dates = pd.to_datetime(df['Date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    out = df[BAR_COLUMNS[1:]].astype('float64')
+    out.insert(0, 'Date', dates.dt.normalize())
+    out = out.drop_duplicates(subset='Date', keep='last').sort_values('Date')
+    return out.reset_index(drop=True)
+
+def _load_meta(symbol: str) -> Dict:
+    try:
+        with open(_file_stem(symbol) + '.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_bars(symbol: str) -> Optional[pd.DataFrame]:
+    """Read the stored bars for an already-resolved symbol, or None if nothing is stored."""
+    path = _file_stem(symbol) + '.parquet'
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable bar file for {symbol}: {str(e)}")
+        return None
+
+def save_bars(symbol: str, df: pd.DataFrame, covered_from: pd.Timestamp):
+    """
+    Atomically replace the stored bars and metadata for a symbol. Temp files are unique
+    per write so workers saving the same symbol never share one.
+    """
+    os.makedirs(BAR_STORE_DIR, exist_ok=True)
+    stem = _file_stem(symbol)
+    tmp = f"{stem}.{os.getpid()}.{uuid.uuid4().hex}"
+    df.to_parquet(tmp + '.parquet.tmp', index=False)
+    os.replace(tmp + '.parquet.tmp', stem + '.parquet')
+    meta = {
+        "covered_from": covered_from.strftime('%Y-%m-%d'),
+        "refreshed_at": datetime.now().isoformat(),
+        "last_date": df['Date'].iloc[-1].strftime('%Y-%m-%d') if not df.empty else None,
+        "last_close": float(df['Close'].iloc[-1]) if not df.empty else None
+    }
+    with open(tmp + '.json.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp + '.json.tmp', stem + '.json')
+
+def get_bars(symbol: str, start_date: str, download: Callable[[str, str, str], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Return daily bars for an already-resolved symbol from start_date onwards.
+
+    Bars already on disk are served locally; only the range before the first stored
+    bar and the bars since the last stored date are requested through `download`,
+    which is called as download(symbol, start, end) with an exclusive end date.
+    If the upstream refresh fails, whatever is stored is returned instead.
+    """
+    start = pd.Timestamp(start_date).normalize()
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    with _symbol_lock(symbol):
+        stored = load_bars(symbol)
+        meta = _load_meta(symbol) if stored is not None else {}
+        covered_from = pd.Timestamp(meta['covered_from']) if meta.get('covered_from') else None
+        parts = [stored] if stored is not None and not stored.empty else []
+        changed = False
+
+        try:
+            if not parts:
+                fresh = normalize_bars(download(symbol, start.strftime('%Y-%m-%d'), tomorrow))
+                if fresh.empty:
+                    return fresh
+                parts, covered_from, changed = [fresh], start, True
+            else:
+                first_date, last_date = stored['Date'].iloc[0], stored['Date'].iloc[-1]
+                if covered_from is None or start < covered_from - timedelta(days=BACKFILL_TOLERANCE_DAYS):
+                    if start < first_date:
+                        logger.info(f"Backfilling {symbol} from {start.date()} to {first_date.date()}")
+                        parts.insert(0, normalize_bars(download(symbol, start.strftime('%Y-%m-%d'), first_date.strftime('%Y-%m-%d'))))
+                    covered_from = min(start, covered_from) if covered_from is not None else start
+                    changed = True
+
+                refreshed_at = datetime.fromisoformat(meta['refreshed_at']) if meta.get('refreshed_at') else datetime.min
+                if datetime.now() - refreshed_at > timedelta(seconds=BAR_REFRESH_SECONDS):
+                    # Re-request the last stored bar too, it may have been a partial session
+                    logger.info(f"Refreshing {symbol} bars since {last_date.date()}")
+                    parts.append(normalize_bars(download(symbol, last_date.strftime('%Y-%m-%d'), tomorrow)))
+                    changed = True
+        except Exception as e:
+            logger.warning(f"Upstream refresh failed for {symbol}, serving stored bars: {str(e)}")
+            if not parts:
+                raise
+
+        bars = parts[0]
+        if len(parts) > 1:
+            bars = pd.concat(parts, ignore_index=True)
+            bars = bars.drop_duplicates(subset='Date', keep='last').sort_values('Date').reset_index(drop=True)
+        if changed and not bars.empty:
+            try:
+                save_bars(symbol, bars, covered_from)
+            except Exception as e:
+                logger.warning(f"Failed to persist bars for {symbol}: {str(e)}")
+
+    return bars[bars['Date'] >= start].reset_index(drop=True)
+
+def pending_since(symbol: str, start_date: str) -> Optional[pd.Timestamp]:
+    """Earliest date get_bars would request upstream for this range, or None if it can serve from disk."""
+    start = pd.Timestamp(start_date).normalize()
+    meta = _load_meta(symbol)
+    if not meta.get('last_date') or not has_bars(symbol):
+        return start
+    covered_from = pd.Timestamp(meta['covered_from']) if meta.get('covered_from') else None
+    if covered_from is None or start < covered_from - timedelta(days=BACKFILL_TOLERANCE_DAYS):
+        return start
+    refreshed_at = datetime.fromisoformat(meta['refreshed_at']) if meta.get('refreshed_at') else datetime.min
+    if datetime.now() - refreshed_at > timedelta(seconds=BAR_REFRESH_SECONDS):
+        return pd.Timestamp(meta['last_date'])
+    return None
+
+def has_bars(symbol: str) -> bool:
+    """Whether anything is stored for this exact ticker."""
+    return os.path.exists(_file_stem(symbol) + '.parquet')
+
+def bar_version(symbol: str) -> Optional[str]:
+    """
+    Identifier of the latest stored bar (date and close, so an intraday revision counts
+    as new data), read from the metadata alone; None if nothing is stored.
+    """
+    meta = _load_meta(symbol)
+    if not meta.get('last_date'):
+        return None
+    return f"{meta['last_date']}:{meta.get('last_close')}"
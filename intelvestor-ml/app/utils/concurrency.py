@@ -0,0 +1,44 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bound on blocking upstream calls (yfinance, NewsAPI client) in flight per worker
+IO_MAX_WORKERS = int(os.getenv("IO_MAX_WORKERS", "16"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+
+T = TypeVar('T')
+
+_io_executor = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="intelvestor-io")
+_http_client: Optional[httpx.AsyncClient] = None
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call on the bounded I/O executor without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, partial(func, *args, **kwargs))
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP client, so upstream calls reuse pooled keep-alive connections."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def shutdown_executor():
+    _io_executor.shutdown(wait=False, cancel_futures=True)
@@ -3,40 +3,131 @@ from datetime import datetime, timedelta
 import pandas as pd
 import logging
 import time
+from typing import Dict, List, Optional, Tuple
+from .bar_store import get_bars, has_bars, normalize_bars, pending_since
+from .symbols import symbol_registry, SymbolNotFoundError
+from .metrics import record_upstream_error, span
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def download_bars(symbol: str, start_date: str, end_date: str, retries: int = 3, delay: int = 2) -> pd.DataFrame:
+    """
+    Download daily bars for one exact ticker from yfinance, retrying only on raised errors.
+    An empty frame ("symbol may be delisted", no timezone, no price data) is returned as
+    a miss without retrying. yfinance gives the same empty frame for some transient
+    failures, which is why SymbolRegistry only caches misses briefly.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            with span("yfinance_download"):
+                df = yf.download(symbol, start=start_date, end=end_date, progress=False)
+            if df.empty:
+                logger.warning(f"No data found for {symbol}")
+            return df
+        except Exception as e:
+            logger.error(f"Attempt {attempt} failed for {symbol}: {str(e)}")
+            record_upstream_error("yfinance")
+            if attempt < retries:
+                logger.info(f"Retrying in {delay} seconds...")
+                time.sleep(delay)
+            else:
+                logger.error(f"Failed to fetch data for {symbol} after {retries} attempts")
+                raise
+    return pd.DataFrame()
+
 def fetch_historical(symbol: str, start_date: str = None, retries: int = 3, delay: int = 2) -> pd.DataFrame:
     if not start_date:
         start_date = (datetime.now() - timedelta(days=365*2)).strftime('%Y-%m-%d')
-    end_date = datetime.now().strftime('%Y-%m-%d')
-    
-    # Try different symbol formats for Indian stocks
-    symbol_formats = [f"{symbol}.BO", f"{symbol}.NS", symbol]
-    
-    for symbol_format in symbol_formats:
-        logger.info(f"Fetching historical data for {symbol_format} from {start_date} to {end_date}")
-        
-        for attempt in range(1, retries + 1):
-            try:
-                df = yf.download(symbol_format, start=start_date, end=end_date, progress=False)
-                if df.empty:
-                    logger.warning(f"No data found for {symbol_format} on attempt {attempt}")
-                    continue
-                    
-                df.reset_index(inplace=True)
-                df['Date'] = pd.to_datetime(df['Date'])
-                logger.info(f"Successfully fetched data for {symbol_format}: {len(df)} rows")
-                return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
-            except Exception as e:
-                logger.error(f"Attempt {attempt} failed for {symbol_format}: {str(e)}")
-                if attempt < retries:
-                    logger.info(f"Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                else:
-                    logger.error(f"Failed to fetch data for {symbol_format} after {retries} attempts")
-                    break
-    
-    # If all formats fail, raise error
-    raise ValueError(f"Failed to fetch data for {symbol} in any format (.BO, .NS, or direct)")
\ No newline at end of file
+    
+    def probe(symbol_format: str) -> Optional[pd.DataFrame]:
+        logger.info(f"Fetching historical data for {symbol_format} from {start_date}")
+        df = get_bars(symbol_format, start_date, lambda s, start, end: download_bars(s, start, end, retries, delay))
+        return df if not df.empty else None
+    
+    # The registry remembers which exchange suffix worked (or that none did)
+    try:
+        symbol_format, df = symbol_registry.resolve(symbol, probe)
+    except SymbolNotFoundError as e:
+        raise ValueError(f"Failed to fetch data for {symbol} in any format (.NS, .BO, or direct): {str(e)}")
+    
+    logger.info(f"Successfully fetched data for {symbol_format}: {len(df)} rows")
+    return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+def download_bars_many(symbols: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+    """Download daily bars for many exact tickers in one yfinance request."""
+    if len(symbols) == 1:
+        return {symbols[0]: download_bars(symbols[0], start_date, end_date)}
+    with span("yfinance_bulk_download"):
+        df = yf.download(symbols, start=start_date, end=end_date, group_by='ticker', progress=False, threads=True)
+    frames = {}
+    for symbol in symbols:
+        if symbol in df.columns.get_level_values(0):
+            frame = df[symbol].dropna(how='all')
+            if not frame.empty:
+                frames[symbol] = frame
+    return frames
+
+def fetch_historical_many(symbols: List[str], start_date: str = None) -> Dict[str, Tuple[str, pd.DataFrame]]:
+    """
+    Bars for many symbols at once, keyed by the requested symbol as (resolved ticker, bars).
+
+    Symbols whose exchange suffix is already known are refreshed through a single bulk
+    download covering every range the bar store is missing; the rest are resolved one
+    by one. Symbols that cannot be resolved are left out of the result.
+    """
+    if not start_date:
+        start_date = (datetime.now() - timedelta(days=365*2)).strftime('%Y-%m-%d')
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    symbols = list(dict.fromkeys(symbols))
+    
+    known = {}
+    for symbol in symbols:
+        cached, resolved = symbol_registry.lookup(symbol)
+        if not cached:
+            stored = [candidate for candidate in symbol_registry.candidates(symbol) if has_bars(candidate)]
+            resolved = stored[0] if stored else None
+        if resolved:
+            known[symbol] = resolved
+    
+    pending = {ticker: pending_since(ticker, start_date) for ticker in set(known.values())}
+    pending = {ticker: since for ticker, since in pending.items() if since is not None}
+    bulk = {}
+    if pending:
+        since = min(pending.values()).strftime('%Y-%m-%d')
+        logger.info(f"Bulk refreshing {len(pending)} symbols from {since}")
+        try:
+            bulk = download_bars_many(sorted(pending), since, tomorrow)
+        except Exception as e:
+            logger.warning(f"Bulk download failed, falling back to per-symbol requests: {str(e)}")
+            record_upstream_error("yfinance")
+    
+    def from_bulk(ticker: str, start: str, end: str) -> pd.DataFrame:
+        if ticker not in bulk:
+            return download_bars(ticker, start, end)
+        frame = normalize_bars(bulk[ticker])
+        return frame[(frame['Date'] >= pd.Timestamp(start)) & (frame['Date'] < pd.Timestamp(end))]
+    
+    def probe(ticker: str) -> Optional[pd.DataFrame]:
+        df = get_bars(ticker, start_date, download_bars)
+        return df if not df.empty else None
+    
+    results = {}
+    for symbol, ticker in known.items():
+        try:
+            df = get_bars(ticker, start_date, from_bulk)
+        except Exception as e:
+            logger.warning(f"Failed to load bars for {ticker}: {str(e)}")
+            continue
+        if not df.empty:
+            symbol_registry.remember(symbol, ticker)
+            results[symbol] = (ticker, df)
+    
+    for symbol in symbols:
+        if symbol in results or symbol_registry.lookup(symbol) == (True, None):
+            continue
+        try:
+            results[symbol] = symbol_registry.resolve(symbol, probe)
+        except Exception as e:
+            logger.info(f"Skipping {symbol}: {str(e)}")
+    return results
@@ -1,49 +1,166 @@
 import pandas as pd
 import numpy as np
+from scipy.signal import lfilter
+from typing import Dict
+from .metrics import timed
+
+INDICATOR_COLUMNS = ['sma_20', 'sma_50', 'rsi_14', 'macd', 'bb_middle', 'bb_std', 'bb_upper', 'bb_lower', 'volume_sma_20']
+
+def rolling_mean_std(values: np.ndarray, window: int, with_std: bool = False):
+    """
+    Rolling mean (and sample std) down axis 0 of a (T, N) panel in one cumulative-sum pass.
+
+    Matches pandas rolling(window).mean()/.std(): a row only gets a value once `window`
+    non-NaN observations are in its window. Each column is shifted by its first value
+    before summing so the sum of squares doesn't lose precision on large prices.
+    """
+    T, N = values.shape
+    valid = np.isfinite(values)
+    first = values[valid.argmax(axis=0), np.arange(N)]
+    first = np.where(np.isfinite(first), first, 0.0)
+
+    x = values - first
+    x[~valid] = 0.0
+    sums = np.zeros((T + 1, N))
+    np.cumsum(x, axis=0, out=sums[1:])
+    counts = np.zeros((T + 1, N))
+    np.cumsum(valid, axis=0, out=counts[1:])
+
+    mean = np.full((T, N), np.nan)
+    std = np.full((T, N), np.nan) if with_std else None
+    if T < window:
+        return mean, std
+
+    s1 = sums[window:] - sums[:-window]
+    full = (counts[window:] - counts[:-window]) == window
+    mean[window - 1:] = np.where(full, s1 / window + first, np.nan)
+
+    if with_std:
+        x *= x
+        np.cumsum(x, axis=0, out=sums[1:])
+        s2 = sums[window:] - sums[:-window]
+        var = np.maximum(s2 - s1 * s1 / window, 0.0) / (window - 1)
+        std[window - 1:] = np.where(full, np.sqrt(var), np.nan)
+    return mean, std
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """pandas ewm(span=span, adjust=False).mean() down axis 0 of a (T, N) panel with leading NaNs."""
+    alpha = 2.0 / (span + 1)
+    valid = np.isfinite(values)
+    start = valid.argmax(axis=0)
+    first = values[start, np.arange(values.shape[1])]
+    # Seed the filter with each column's first value so y[start] == x[start], as pandas does
+    padded = np.where(np.arange(values.shape[0])[:, None] < start, first, values)
+    out, _ = lfilter([alpha], [1.0, alpha - 1.0], padded, axis=0, zi=((1.0 - alpha) * first)[None, :])
+    out[~valid] = np.nan
+    return out
+
+def compute_indicator_panel(close: np.ndarray, volume: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Compute every technical indicator for many symbols at once.
+
+    Args:
+        close: (T, N) float array of closes, one column per symbol, NaN where a symbol has no bar.
+        volume: (T, N) float array of volumes aligned with close.
+
+    Returns:
+        Dict of INDICATOR_COLUMNS (plus volatility_20) to (T, N) arrays.
+    """
+    close = np.asarray(close, dtype='float64')
+    volume = np.asarray(volume, dtype='float64')
+    valid = np.isfinite(close)
+
+    # Simple Moving Average (SMA); the 20-day one doubles as the Bollinger middle band
+    sma_20, std_20 = rolling_mean_std(close, 20, with_std=True)
+    sma_50, _ = rolling_mean_std(close, 50)
+
+    # Relative Strength Index (RSI); the first bar of each symbol counts as a zero move
+    delta = np.full_like(close, np.nan)
+    delta[1:] = close[1:] - close[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        gain[~valid] = np.nan
+        loss[~valid] = np.nan
+        avg_gain, _ = rolling_mean_std(gain, 14)
+        avg_loss, _ = rolling_mean_std(loss, 14)
+        rs = avg_gain / np.where(np.isnan(avg_loss), 1e-10, avg_loss)  # Avoid div by zero
+        rsi = 100 - (100 / (1 + rs))
+
+        # Daily return volatility
+        returns = np.full_like(close, np.nan)
+        returns[1:] = close[1:] / close[:-1] - 1
+    volatility_20 = rolling_mean_std(returns, 20, with_std=True)[1]
+
+    # MACD (Exponential Moving Average based)
+    macd = ema(close, 12) - ema(close, 26)
+
+    # Volume Moving Average
+    volume_sma_20, _ = rolling_mean_std(np.where(valid, volume, np.nan), 20)
+
+    return {
+        'sma_20': sma_20,
+        'sma_50': sma_50,
+        'rsi_14': rsi,
+        'macd': macd,
+        'bb_middle': sma_20,
+        'bb_std': std_20,
+        'bb_upper': sma_20 + 2 * std_20,
+        'bb_lower': sma_20 - 2 * std_20,
+        'volume_sma_20': volume_sma_20,
+        'volatility_20': volatility_20
+    }
+
+@timed("build_features")
+def build_feature_panel(frames: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    Build technical indicators for many symbols in one vectorized pass.
+
+    Histories are right-aligned by position into a (T, N) panel, so each symbol's
+    windows cover exactly its own bars as they would in a per-symbol rolling pass.
+
+    Args:
+        frames: Symbol to DataFrame with OHLCV columns (Open, High, Low, Close, Volume).
+
+    Returns:
+        Symbol to DataFrame with the same columns build_features produces.
+    """
+    if not frames:
+        return {}
+    symbols = list(frames)
+    T = max(len(frames[s]) for s in symbols)
+    close = np.full((T, len(symbols)), np.nan)
+    volume = np.full((T, len(symbols)), np.nan)
+    for j, s in enumerate(symbols):
+        n = len(frames[s])
+        close[T - n:, j] = frames[s]['Close'].to_numpy(dtype='float64')
+        volume[T - n:, j] = frames[s]['Volume'].to_numpy(dtype='float64')
+
+    indicators = compute_indicator_panel(close, volume)
+
+    results = {}
+    for j, s in enumerate(symbols):
+        data = frames[s]
+        n = len(data)
+        columns = {'Date': pd.to_datetime(data.index if 'Date' not in data.columns else data['Date']).to_numpy()}
+        for col in data.columns:
+            if col != 'Date':
+                columns[col] = data[col].to_numpy()
+        for col in INDICATOR_COLUMNS:
+            columns[col] = indicators[col][T - n:, j]
+        df = pd.DataFrame(columns)
+        # Drop NaN values
+        results[s] = df.dropna().reset_index(drop=True)
+    return results
 
 def build_features(data: pd.DataFrame) -> pd.DataFrame:
     """
     Build technical indicators manually without pandas-ta.
-    
+
     Args:
         data: DataFrame with OHLCV columns (Open, High, Low, Close, Volume).
-    
+
     Returns:
         DataFrame with additional feature columns.
     """
-    df = data.copy()
-    
-    # Simple Moving Average (SMA)
-    df['sma_20'] = df['Close'].rolling(window=20).mean()
-    df['sma_50'] = df['Close'].rolling(window=50).mean()
-    
-    # Relative Strength Index (RSI)
-    delta = df['Close'].diff()
-    gain = delta.where(delta > 0, 0).rolling(window=14).mean()
-    loss = -delta.where(delta < 0, 0).rolling(window=14).mean()
-    rs = gain / loss.replace([np.inf, -np.inf], np.nan).fillna(1e-10)  # Avoid div by zero
-    df['rsi_14'] = 100 - (100 / (1 + rs))
-    
-    # MACD (Exponential Moving Average based)
-    ema_12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema_26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['macd'] = ema_12 - ema_26
-    
-    # Bollinger Bands
-    df['bb_middle'] = df['Close'].rolling(window=20).mean()
-    df['bb_std'] = df['Close'].rolling(window=20).std()
-    df['bb_upper'] = df['bb_middle'] + 2 * df['bb_std']
-    df['bb_lower'] = df['bb_middle'] - 2 * df['bb_std']
-    
-    # Volume Moving Average
-    df['volume_sma_20'] = df['Volume'].rolling(window=20).mean()
-    
-    # Ensure Date is a column and datetime
-    df['Date'] = pd.to_datetime(df.index if 'Date' not in df.columns else df['Date'])
-    df.set_index('Date', inplace=True)
-    df.reset_index(inplace=True)
-    
-    # Drop NaN values
-    df = df.dropna().reset_index(drop=True)
-    
-    return df
\ No newline at end of file
+    return build_feature_panel({'': data})['']
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, TypeVar
+from .metrics import record_cache
+
+# Longest horizon the API serves; every forecast is computed this far and sliced
+FORECAST_MAX_HORIZON = 90
+# Full-horizon forecasts kept in memory across symbols, models and data versions
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "512"))
+
+T = TypeVar('T')
+
+class ForecastCache:
+    """
+    Full FORECAST_MAX_HORIZON forecasts keyed by model, symbol and data version.
+
+    Requests for any horizon of the same key share one computation: concurrent
+    misses wait for the first caller's result, and shorter horizons are served by
+    slicing the stored trajectory. Entries are bounded by an LRU; a new data version
+    is a new key, so outdated forecasts simply age out.
+    """
+
+    def __init__(self, capacity: int = FORECAST_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Cached forecast for key, calling compute() at most once across concurrent misses."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                record_cache("forecast", "hit")
+                return self._entries[key]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            record_cache("forecast", "miss" if owner else "coalesced")
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def get_many(self, keys: List[Hashable], compute: Callable[[List[Hashable]], Dict[Hashable, T]]) -> Dict[Hashable, T]:
+        """
+        Cached forecasts for many keys. The misses this caller claims are computed together
+        by one compute(missing keys) call returning a value per key, for models that
+        forecast a whole batch of symbols at once; keys already being computed are awaited.
+        """
+        results, waiting, owned = {}, {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[key] = self._entries[key]
+                    record_cache("forecast", "hit")
+                elif key in self._in_flight:
+                    waiting[key] = self._in_flight[key]
+                    record_cache("forecast", "coalesced")
+                else:
+                    owned[key] = self._in_flight[key] = Future()
+                    record_cache("forecast", "miss")
+        if owned:
+            try:
+                values = compute(list(owned))
+            except Exception as e:
+                with self._lock:
+                    for key in owned:
+                        self._in_flight.pop(key, None)
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+            with self._lock:
+                for key in owned:
+                    self._in_flight.pop(key, None)
+                    self._entries[key] = values[key]
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+            for key, future in owned.items():
+                future.set_result(values[key])
+                results[key] = values[key]
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return results
+
+forecast_cache = ForecastCache()
@@ -0,0 +1,272 @@
+import os
+import json
+import math
+import logging
+import threading
+import uuid
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDICATOR_STATE_PATH = os.getenv("INDICATOR_STATE_PATH", os.path.join("data", "indicators.json"))
+
+NAN = float('nan')
+ZERO_TOLERANCE = 1e-9
+
+class RollingWindow:
+    """
+    Running sum and sum of squares over the last `window` values with O(1) push and pop.
+
+    One value beyond the window is retained so the latest push can be undone, which is
+    how an intraday revision of the current bar is applied. Values are shifted by a
+    recent value so the sum of squares stays precise for large prices.
+    """
+
+    def __init__(self, window: int, values: Iterable[float] = (), ref: Optional[float] = None):
+        self.window = window
+        self.values = deque(maxlen=window + 1)
+        self.ref = ref
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self._pushes = 0
+        for value in values:
+            self.push(value)
+
+    def push(self, value: float):
+        if self.ref is None:
+            self.ref = value
+        self.values.append(value)
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            self._resum()
+            return
+        x = value - self.ref
+        self.sum += x
+        self.sumsq += x * x
+        if len(self.values) == self.window + 1:
+            old = self.values[0] - self.ref
+            self.sum -= old
+            self.sumsq -= old * old
+
+    def pop(self) -> float:
+        value = self.values.pop()
+        x = value - self.ref
+        self.sum -= x
+        self.sumsq -= x * x
+        if len(self.values) >= self.window:
+            back = self.values[-self.window] - self.ref
+            self.sum += back
+            self.sumsq += back * back
+        return value
+
+    def _resum(self):
+        # Recompute exactly once per window length, re-centred on the latest value, so
+        # floating-point drift can't accumulate; amortised this is still O(1) per push
+        window = list(self.values)[-self.window:]
+        self.ref = window[-1]
+        self.sum = sum(v - self.ref for v in window)
+        self.sumsq = sum((v - self.ref) ** 2 for v in window)
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) >= self.window
+
+    def mean(self) -> float:
+        return self.sum / self.window + self.ref if self.full else NAN
+
+    def std(self) -> float:
+        if not self.full:
+            return NAN
+        var = (self.sumsq - self.sum * self.sum / self.window) / (self.window - 1)
+        # Treat cancellation residue on a flat window as the exact zero it is
+        if var <= 1e-12 * self.mean() ** 2:
+            return 0.0
+        return math.sqrt(var)
+
+class IndicatorState:
+    """
+    Incremental SMA-20/50, RSI-14, MACD, Bollinger bands and volume SMA-20 for one symbol.
+
+    Feeding bars one at a time through update() yields the same values as
+    build_features over the full history. Calling update() again with the date of
+    the last bar revises that bar instead of appending a new one.
+    """
+
+    def __init__(self):
+        self.close_20 = RollingWindow(20)
+        self.close_50 = RollingWindow(50)
+        self.gain_14 = RollingWindow(14, ref=0.0)
+        self.loss_14 = RollingWindow(14, ref=0.0)
+        self.volume_20 = RollingWindow(20)
+        self.ema_12: Optional[float] = None
+        self.ema_26: Optional[float] = None
+        self.prev_close: Optional[float] = None
+        self.last_date: Optional[str] = None
+        self.last_close: Optional[float] = None
+        # Values before the latest bar, needed to revise it
+        self._undo: Tuple[Optional[float], Optional[float], Optional[float]] = (None, None, None)
+
+    @staticmethod
+    def _ema(prev: Optional[float], value: float, span: int) -> float:
+        alpha = 2.0 / (span + 1)
+        return value if prev is None else prev + alpha * (value - prev)
+
+    def _revise_last(self):
+        for window in (self.close_20, self.close_50, self.gain_14, self.loss_14, self.volume_20):
+            window.pop()
+        self.ema_12, self.ema_26, self.prev_close = self._undo
+
+    def update(self, close: float, volume: float, date: Optional[str] = None) -> Dict[str, float]:
+        """Apply one bar (or a revision of the current one) in O(1) and return the latest indicators."""
+        close, volume = float(close), float(volume)
+        if date is not None and date == self.last_date:
+            self._revise_last()
+        self._undo = (self.ema_12, self.ema_26, self.prev_close)
+
+        delta = close - self.prev_close if self.prev_close is not None else 0.0
+        self.close_20.push(close)
+        self.close_50.push(close)
+        self.gain_14.push(delta if delta > 0 else 0.0)
+        self.loss_14.push(-delta if delta < 0 else 0.0)
+        self.volume_20.push(volume)
+        self.ema_12 = self._ema(self.ema_12, close, 12)
+        self.ema_26 = self._ema(self.ema_26, close, 26)
+        self.prev_close = close
+        self.last_close = close
+        self.last_date = date
+        return self.indicators()
+
+    def indicators(self) -> Dict[str, float]:
+        sma_20 = self.close_20.mean()
+        bb_std = self.close_20.std()
+        avg_gain, avg_loss = self.gain_14.mean(), self.loss_14.mean()
+        if math.isnan(avg_gain):
+            rsi = NAN
+        elif avg_loss <= ZERO_TOLERANCE:
+            # A window without losses; running sums may leave a tiny residue instead of an exact zero
+            rsi = 100.0 if avg_gain > ZERO_TOLERANCE else NAN
+        else:
+            rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+        return {
+            'sma_20': sma_20,
+            'sma_50': self.close_50.mean(),
+            'rsi_14': rsi,
+            'macd': self.ema_12 - self.ema_26 if self.ema_12 is not None else NAN,
+            'bb_middle': sma_20,
+            'bb_std': bb_std,
+            'bb_upper': sma_20 + 2 * bb_std,
+            'bb_lower': sma_20 - 2 * bb_std,
+            'volume_sma_20': self.volume_20.mean()
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'closes': list(self.close_50.values),
+            'volumes': list(self.volume_20.values),
+            'gains': list(self.gain_14.values),
+            'losses': list(self.loss_14.values),
+            'close_ref': self.close_50.ref,
+            'volume_ref': self.volume_20.ref,
+            'ema_12': self.ema_12,
+            'ema_26': self.ema_26,
+            'prev_close': self.prev_close,
+            'last_date': self.last_date,
+            'undo': list(self._undo)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'IndicatorState':
+        state = cls()
+        closes = data['closes']
+        state.close_50 = RollingWindow(50, closes, ref=data.get('close_ref'))
+        state.close_20 = RollingWindow(20, closes[-21:], ref=data.get('close_ref'))
+        state.gain_14 = RollingWindow(14, data['gains'], ref=0.0)
+        state.loss_14 = RollingWindow(14, data['losses'], ref=0.0)
+        state.volume_20 = RollingWindow(20, data['volumes'], ref=data.get('volume_ref'))
+        state.ema_12 = data['ema_12']
+        state.ema_26 = data['ema_26']
+        state.prev_close = data['prev_close']
+        state.last_close = closes[-1] if closes else None
+        state.last_date = data['last_date']
+        state._undo = tuple(data.get('undo', (None, None, None)))
+        return state
+
+    @classmethod
+    def from_history(cls, closes: Iterable[float], volumes: Iterable[float], dates: Optional[Iterable[str]] = None) -> 'IndicatorState':
+        """Seed the state by replaying a history once; later bars are then O(1)."""
+        state = cls()
+        dates = list(dates) if dates is not None else None
+        for i, (close, volume) in enumerate(zip(closes, volumes)):
+            state.update(close, volume, dates[i] if dates is not None else None)
+        return state
+
+class IndicatorStore:
+    """Per-symbol IndicatorState map that can be saved to and restored from a JSON file."""
+
+    def __init__(self, path: str = INDICATOR_STATE_PATH):
+        self.path = path
+        self.states: Dict[str, IndicatorState] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.states.update({symbol: IndicatorState.from_dict(state) for symbol, state in data.items()})
+            logger.info(f"Restored indicator state for {len(data)} symbols")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to restore indicator state from {self.path}: {str(e)}")
+
+    def get(self, symbol: str) -> Optional[IndicatorState]:
+        with self._lock:
+            self._ensure_loaded()
+            return self.states.get(symbol)
+
+    def seed(self, symbol: str, closes: Iterable[float], volumes: Iterable[float], dates: Optional[Iterable[str]] = None) -> IndicatorState:
+        state = IndicatorState.from_history(closes, volumes, dates)
+        with self._lock:
+            self._ensure_loaded()
+            self.states[symbol] = state
+        return state
+
+    def update(self, symbol: str, close: float, volume: float, date: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """Apply one bar for a symbol; returns None for a symbol that was never seeded."""
+        with self._lock:
+            self._ensure_loaded()
+            state = self.states.get(symbol)
+            return state.update(close, volume, date) if state is not None else None
+
+    def update_many(self, bars: Dict[str, Tuple[float, float, Optional[str]]]) -> Dict[str, Dict[str, float]]:
+        """Apply one tick for many symbols, given as symbol -> (close, volume, date)."""
+        results = {}
+        with self._lock:
+            self._ensure_loaded()
+            for symbol, (close, volume, date) in bars.items():
+                state = self.states.get(symbol)
+                if state is not None:
+                    results[symbol] = state.update(close, volume, date)
+        return results
+
+    def save(self):
+        with self._lock:
+            if not self.states:
+                return
+            data = {symbol: state.to_dict() for symbol, state in self.states.items()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Unique temp name: other workers may be saving the same file
+        tmp_path = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+indicator_store = IndicatorStore()
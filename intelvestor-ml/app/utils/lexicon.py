@@ -0,0 +1,212 @@
+import os
+import re
+import math
+import logging
+from bisect import bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Optional extra lexicon, one "term<TAB>weight" per line, merged over the built-in one
+SENTIMENT_LEXICON_PATH = os.getenv("SENTIMENT_LEXICON_PATH", "")
+# Weight multiplier for terms inside a negation's scope
+NEGATION_FACTOR = -0.75
+# Tokens after a negator that it still applies to
+NEGATION_SCOPE = 3
+
+# Base financial-news vocabulary. Single words are expanded to their inflections
+# (beat -> beats, beating, ...), phrases are matched as written.
+POSITIVE_TERMS = {
+    2.0: ['beat estimates', 'beats estimates', 'record high', 'all-time high', 'raises guidance', 'raised guidance',
+          'blowout', 'skyrocket', 'soar', 'surge', 'outperform', 'upgrade', 'breakthrough', 'record profit'],
+    1.5: ['rally', 'jump', 'boom', 'bullish', 'beat', 'exceed', 'surpass', 'outpace', 'stellar', 'robust', 'strong',
+          'rebound', 'recover', 'recovery', 'profit', 'profitable', 'profitability', '52-week high', 'order win',
+          'strong demand', 'margin expansion', 'buyback', 'dividend hike', 'upbeat', 'optimistic', 'optimism'],
+    1.0: ['gain', 'rise', 'climb', 'advance', 'growth', 'grow', 'expand', 'expansion', 'positive', 'improve',
+          'improvement', 'boost', 'win', 'award', 'approve', 'approval', 'launch', 'partnership', 'milestone',
+          'innovation', 'innovative', 'competitive', 'resilient', 'solid', 'upside', 'momentum', 'accelerate',
+          'dividend', 'bonus', 'upgrade rating', 'overweight', 'buy rating', 'top pick', 'tailwind', 'healthy',
+          'steady', 'stable', 'confident', 'confidence', 'success', 'successful', 'lead', 'leader', 'leadership',
+          'opportunity', 'favorable', 'favourable', 'attractive', 'undervalued', 'inflow', 'demand', 'secure',
+          'strengthen', 'benefit', 'efficient', 'efficiency', 'upturn', 'uptrend', 'breakout', 'higher',
+          'strategic', 'acquire', 'acquisition', 'deal', 'contract', 'order', 'orders', 'rebound', 'revive'],
+    0.5: ['up', 'edge up', 'inch up', 'recommend', 'maintain', 'sustain', 'hold steady', 'on track', 'in line']
+}
+
+NEGATIVE_TERMS = {
+    2.0: ['plunge', 'crash', 'collapse', 'tank', 'nosedive', 'bankruptcy', 'bankrupt', 'fraud', 'scam', 'scandal',
+          'default', 'insolvency', 'profit warning', 'misses estimates', 'missed estimates', 'cuts guidance',
+          'cut guidance', 'lowers guidance', 'record low', 'all-time low', 'downgrade', 'sell-off', 'selloff'],
+    1.5: ['slump', 'tumble', 'plummet', 'sink', 'slide', 'bearish', 'loss', 'losses', 'miss', 'weak', 'weakness',
+          'underperform', 'lawsuit', 'probe', 'investigation', 'raid', 'penalty', 'layoff', 'layoffs', 'job cuts',
+          'recall', 'halt', 'suspend', 'ban', 'shortfall', 'disappoint', 'disappointing', 'pessimistic', 'pessimism',
+          '52-week low', 'downturn', 'recession', 'slowdown', 'writedown', 'write-off', 'impairment'],
+    1.0: ['decline', 'drop', 'fall', 'fell', 'lower', 'dip', 'slip', 'shed', 'negative', 'concern', 'worry', 'fear',
+          'risk', 'volatility', 'volatile', 'uncertain', 'uncertainty', 'pressure', 'headwind', 'delay', 'debt',
+          'deficit', 'cut', 'slash', 'warn', 'warning', 'resign', 'resignation', 'exit', 'outflow', 'sell rating',
+          'underweight', 'overvalued', 'dispute', 'fine', 'fined', 'sanction', 'strike', 'protest', 'shutdown',
+          'struggle', 'stall', 'stagnant', 'sluggish', 'hurt', 'hit', 'drag', 'erode', 'erosion', 'squeeze',
+          'inflation', 'downtrend', 'breakdown', 'challenge', 'challenging', 'threat', 'threaten', 'crisis',
+          'loss-making', 'bleed', 'cautious', 'caution', 'downside', 'outage', 'breach', 'leak', 'hack'],
+    0.5: ['down', 'edge down', 'inch down', 'flat', 'muted', 'mixed', 'soft', 'softer', 'tepid', 'wary']
+}
+
+NEGATORS = ['not', 'no', 'never', 'without', 'neither', 'nor', 'hardly', 'barely', 'cannot', "can't", "won't",
+            "isn't", "aren't", "wasn't", "weren't", "doesn't", "don't", "didn't", 'fails to', 'failed to', 'fail to',
+            'lack of', 'lacks', 'unlikely to']
+
+TOKEN_RE = re.compile(r"[\w'-]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+class HeadlineScore(NamedTuple):
+    score: float
+    positive: int
+    negative: int
+
+    @property
+    def hits(self) -> int:
+        return self.positive + self.negative
+
+    @property
+    def ambiguous(self) -> bool:
+        """True when the lexicon can't call it: no hits, or both polarities with a weak net score."""
+        return self.hits == 0 or (self.positive > 0 and self.negative > 0 and abs(self.score) < 1.0)
+
+def inflections(word: str) -> List[str]:
+    """Common English inflections of a single word (beat -> beats, beating, beaten, ...)."""
+    forms = {word}
+    if ' ' in word or '-' in word or not word.isalpha() or len(word) < 3:
+        return list(forms)
+    stem = word[:-1] if word.endswith('e') else word
+    forms.update([word + 's', stem + 'ing', stem + 'ed'])
+    if word.endswith(('s', 'sh', 'ch', 'x', 'z')):
+        forms.add(word + 'es')
+    if word.endswith('y') and word[-2] not in 'aeiou':
+        forms.update([word[:-1] + 'ies', word[:-1] + 'ied'])
+    if re.search(r'[^aeiou][aeiou][bdgklmnprt]$', word):
+        # Doubled final consonant: slip -> slipped, slipping
+        forms.update([word + word[-1] + 'ed', word + word[-1] + 'ing'])
+    if word.endswith('e'):
+        forms.add(word + 'd')
+    return list(forms)
+
+def build_lexicon(extra: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Expand the base vocabulary into a term -> weight map, with `extra` entries taking precedence."""
+    lexicon: Dict[str, float] = {}
+    for terms, sign in ((POSITIVE_TERMS, 1.0), (NEGATIVE_TERMS, -1.0)):
+        for weight, words in terms.items():
+            for word in words:
+                for form in inflections(word):
+                    lexicon.setdefault(form, sign * weight)
+    if extra:
+        lexicon.update({term.lower(): weight for term, weight in extra.items()})
+    return lexicon
+
+def load_lexicon_file(path: str) -> Dict[str, float]:
+    terms = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            term, weight = line.rsplit('\t', 1)
+            terms[WHITESPACE_RE.sub(' ', term.strip().lower())] = float(weight)
+    return terms
+
+def trie_pattern(terms: Iterable[str]) -> str:
+    """
+    Compile terms into one regex alternation shaped like a prefix trie, so matching
+    cost depends on text length rather than on the number of terms. Longer terms
+    win over their prefixes.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+class LexiconScorer:
+    """
+    Weighted keyword sentiment scorer for headlines.
+
+    Every lexicon term and negator is compiled into one regex, and a whole batch of
+    headlines is scanned in a single pass. Terms within NEGATION_SCOPE tokens after
+    a negator have their weight flipped and damped by NEGATION_FACTOR.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None, negators: Iterable[str] = NEGATORS):
+        self.lexicon = lexicon if lexicon is not None else build_lexicon()
+        self.pattern = re.compile(
+            r"(?<![\w'-])(?:(?P<neg>" + trie_pattern(negators) + r")|(?P<term>" + trie_pattern(self.lexicon) + r"))(?![\w'-])"
+        )
+
+    @staticmethod
+    def normalize(headline: str) -> str:
+        return WHITESPACE_RE.sub(' ', headline.lower().replace('’', "'")).strip()
+
+    def score_batch(self, headlines: List[str]) -> List[HeadlineScore]:
+        """Score many headlines in one regex pass over their concatenation."""
+        texts = [self.normalize(h) for h in headlines]
+        text = '\n'.join(texts)
+        starts, offset = [], 0
+        for t in texts:
+            starts.append(offset)
+            offset += len(t) + 1
+        token_starts = [m.start() for m in TOKEN_RE.finditer(text)]
+
+        totals = [0.0] * len(texts)
+        positive = [0] * len(texts)
+        negative = [0] * len(texts)
+        negated_until = {}
+        for match in self.pattern.finditer(text):
+            index = bisect_right(starts, match.start()) - 1
+            token = bisect_right(token_starts, match.start()) - 1
+            if match.group('neg') is not None:
+                token_end = bisect_right(token_starts, match.end() - 1) - 1
+                negated_until[index] = token_end + NEGATION_SCOPE
+                continue
+            weight = self.lexicon[match.group('term')]
+            if token <= negated_until.get(index, -1):
+                weight *= NEGATION_FACTOR
+            totals[index] += weight
+            if weight > 0:
+                positive[index] += 1
+            elif weight < 0:
+                negative[index] += 1
+        return [HeadlineScore(totals[i], positive[i], negative[i]) for i in range(len(texts))]
+
+    def triage(self, texts: List[str]) -> List[Optional[float]]:
+        """
+        Cheap first tier ahead of the transformer: a score in [-1, 1] for each text the
+        lexicon can call, None for the ambiguous ones that need the model.
+        """
+        return [None if result.ambiguous else math.tanh(result.score / 2) for result in self.score_batch(texts)]
+
+_default_scorer: Optional[LexiconScorer] = None
+
+def get_lexicon_scorer() -> LexiconScorer:
+    """The shared scorer, compiled on first use with SENTIMENT_LEXICON_PATH merged in."""
+    global _default_scorer
+    if _default_scorer is None:
+        extra = None
+        if SENTIMENT_LEXICON_PATH:
+            try:
+                extra = load_lexicon_file(SENTIMENT_LEXICON_PATH)
+            except Exception as e:
+                logger.warning(f"Failed to load lexicon from {SENTIMENT_LEXICON_PATH}: {str(e)}")
+        _default_scorer = LexiconScorer(build_lexicon(extra))
+        logger.info(f"Compiled sentiment lexicon with {len(_default_scorer.lexicon)} terms")
+    return _default_scorer
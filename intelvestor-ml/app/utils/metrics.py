@@ -0,0 +1,273 @@
+import os
+import time
+import bisect
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Latency histogram buckets in seconds, from cache hits up to cold model fits
+METRICS_BUCKETS = tuple(float(b) for b in os.getenv(
+    "METRICS_BUCKETS", "0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120"
+).split(','))
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def items(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in self.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = METRICS_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text exposition format.
+
+    Each uvicorn worker keeps its own registry, so scrape every worker (or run one
+    worker per pod) and aggregate in Prometheus. Collectors registered with
+    add_collector() run just before each render, for values derived at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labels: Iterable[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = METRICS_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "intelvestor_stage_seconds", "Time spent in each stage of the prediction path", ["stage"]
+)
+CACHE_LOOKUPS = metrics.counter(
+    "intelvestor_cache_lookups_total", "Cache lookups by cache and result (hit, stale, coalesced, miss)", ["cache", "result"]
+)
+CACHE_HIT_RATIO = metrics.gauge(
+    "intelvestor_cache_hit_ratio", "Share of lookups served without recomputing, since process start", ["cache"]
+)
+UPSTREAM_ERRORS = metrics.counter(
+    "intelvestor_upstream_errors_total", "Failed calls to upstream services", ["upstream"]
+)
+HTTP_REQUESTS_IN_FLIGHT = metrics.gauge(
+    "intelvestor_http_requests_in_flight", "Requests currently being handled", ["route"]
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "intelvestor_http_request_seconds", "Request latency until the response body is sent", ["method", "route", "status"]
+)
+
+@contextmanager
+def span(stage: str):
+    """Time a block into the stage latency histogram; works on any thread and inside coroutines."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+def timed(stage: str):
+    """Decorator form of span() for plain functions and coroutine functions."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record_cache(cache: str, result: str):
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
+
+def record_upstream_error(upstream: str):
+    UPSTREAM_ERRORS.inc(upstream=upstream)
+
+def _collect_hit_ratios():
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), count in CACHE_LOOKUPS.items():
+        served, total = totals.get(cache, (0.0, 0.0))
+        totals[cache] = [served + (count if result != "miss" else 0.0), total + count]
+    for cache, (served, total) in totals.items():
+        CACHE_HIT_RATIO.set(served / total if total else 0.0, cache=cache)
+
+metrics.add_collector(_collect_hit_ratios)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting in-flight requests and timing each one by route template
+    (e.g. /predict/{symbol}), so per-symbol paths don't explode the label space.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _route(scope) -> str:
+        from starlette.routing import Match
+        router = getattr(scope.get("app"), "router", None)
+        for route in getattr(router, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with HTTP_REQUESTS_IN_FLIGHT.track(route=route):
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, method=scope["method"], route=route, status=str(status["code"])
+                )
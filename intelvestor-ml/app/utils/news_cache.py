@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from .metrics import record_cache
+from .concurrency import run_blocking
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NEWS_CACHE_TTL_SECONDS = int(os.getenv("NEWS_CACHE_TTL_SECONDS", "900"))
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", "512"))
+# Set to an empty string to keep the cache in memory only
+NEWS_CACHE_DIR = os.getenv("NEWS_CACHE_DIR", os.path.join("data", "news"))
+
+Articles = List[Dict[str, str]]
+
+class NewsCache:
+    """
+    Per-symbol article cache shared by every NewsAPI caller.
+
+    Entries expire after their TTL and the number kept in memory is bounded (LRU).
+    Concurrent misses for the same symbol, sync or async, wait on a single upstream
+    fetch. With a directory configured, entries are also written to disk so a
+    restarted worker starts warm; the async path does that file I/O off the event loop.
+    """
+
+    def __init__(self, ttl: int = NEWS_CACHE_TTL_SECONDS, capacity: int = NEWS_CACHE_SIZE, directory: str = NEWS_CACHE_DIR):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.directory = directory
+        self._entries: "OrderedDict[str, Tuple[float, Articles]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(symbol: str) -> str:
+        return symbol.strip().upper()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace('/', '_').replace('\\', '_') + '.json')
+
+    def _remember(self, key: str, entry: Tuple[float, Articles]):
+        """Insert into memory, evicting the least recently used entries; call with the lock held."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[Articles]:
+        """Fresh articles from memory; call with the lock held."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() >= entry[0]:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _load(self, key: str) -> Optional[Articles]:
+        """Fresh articles from disk, promoted into memory; blocking file I/O without the lock."""
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                stored = json.load(f)
+            entry = (stored['expires_at'], stored['articles'])
+        except (OSError, ValueError, KeyError):
+            return None
+        if time.time() >= entry[0]:
+            return None
+        with self._lock:
+            self._remember(key, entry)
+        return entry[1]
+
+    def _store(self, key: str, articles: Articles, ttl: Optional[int]):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, (expires_at, articles))
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key)
+                tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'expires_at': expires_at, 'articles': articles}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to persist news for {key}: {str(e)}")
+
+    def _claim(self, key: str) -> Tuple[Optional[Articles], Future, bool]:
+        """Return (articles cached in memory, in-flight future, whether this caller must load them)."""
+        with self._lock:
+            articles = self._lookup(key)
+            if articles is not None:
+                record_cache("news", "hit")
+                return articles, None, False
+            if key in self._in_flight:
+                record_cache("news", "coalesced")
+                return None, self._in_flight[key], False
+            future = Future()
+            self._in_flight[key] = future
+            return None, future, True
+
+    def _settle(self, key: str, future: Future, articles: Optional[Articles] = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is None:
+            future.set_result(articles)
+        else:
+            future.set_exception(error)
+
+    def get(self, symbol: str, loader: Callable[[], Articles], ttl: Optional[int] = None) -> Articles:
+        """Cached articles for a symbol, calling loader() at most once across concurrent misses."""
+        key = self._key(symbol)
+        articles, future, owner = self._claim(key)
+        if articles is not None:
+            return articles
+        if not owner:
+            return future.result()
+        try:
+            articles = self._load(key)
+            record_cache("news", "disk" if articles is not None else "miss")
+            if articles is None:
+                articles = loader()
+                self._store(key, articles, ttl)
+        except Exception as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, articles)
+        return articles
+
+    async def get_async(self, symbol: str, loader: Callable[[], Awaitable[Articles]], ttl: Optional[int] = None) -> Articles:
+        """Async form of get(); loader is a coroutine function."""
+        key = self._key(symbol)
+        articles, future, owner = self._claim(key)
+        if articles is not None:
+            return articles
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            articles = await run_blocking(self._load, key)
+            record_cache("news", "disk" if articles is not None else "miss")
+            if articles is None:
+                articles = await loader()
+                await run_blocking(self._store, key, articles, ttl)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, articles)
+        return articles
+
+news_cache = NewsCache()
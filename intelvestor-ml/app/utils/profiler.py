@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Default time between stack samples; 10ms costs well under 1% of a core for a few dozen threads
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+# A session stops by itself after this long, so a forgotten toggle can't run forever
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+# Shared secret for the profiler endpoints, sent by callers as X-Profiler-Token; they return 404 while unset
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+# Deepest stack kept per sample, innermost frames first
+PROFILER_MAX_DEPTH = 64
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for a running worker, off until started.
+
+    A daemon thread snapshots every other thread's Python stack with
+    sys._current_frames() at a fixed interval and counts identical stacks, so the
+    cost is bounded by the interval and nothing is traced between samples. Results
+    come out in the collapsed format read by flamegraph.pl and speedscope. Each worker
+    process has its own profiler and sees only its own threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._started_at: Optional[float] = None
+        self._stopped_at: Optional[float] = None
+        self._interval = PROFILER_INTERVAL_MS / 1000.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = PROFILER_INTERVAL_MS, duration: float = PROFILER_MAX_SECONDS) -> bool:
+        """Start a new session, discarding the previous one; returns False if one is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self._samples = 0
+            self._interval = max(interval_ms, 1.0) / 1000.0
+            self._started_at = time.time()
+            self._stopped_at = None
+            self._stop.clear()
+            duration = min(duration, PROFILER_MAX_SECONDS)
+            self._thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Sampling profiler started: every {self._interval * 1000:.0f}ms for up to {duration:.0f}s")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self, duration: float):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration
+        names = {}
+        while not self._stop.wait(self._interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            batch = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                batch.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(batch)
+                self._samples += 1
+        self._stopped_at = time.time()
+        logger.info(f"Sampling profiler stopped after {self._samples} samples")
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "pid": os.getpid(),
+            "samples": self._samples,
+            "interval_ms": round(self._interval * 1000, 1),
+            "started_at": self._started_at,
+            "stopped_at": self._stopped_at,
+            "distinct_stacks": len(self._stacks)
+        }
+
+    def collapsed(self) -> str:
+        """One `thread;outer;...;inner count` line per distinct stack."""
+        with self._lock:
+            items = self._stacks.most_common()
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def top(self, limit: int = 20) -> List[Dict]:
+        """Functions by share of samples they were executing in (self time)."""
+        leaves: Counter = Counter()
+        with self._lock:
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            total = sum(self._stacks.values())
+        return [
+            {"frame": frame, "samples": count, "share": round(count / total, 4)}
+            for frame, count in leaves.most_common(limit)
+        ]
+
+profiler = SamplingProfiler()
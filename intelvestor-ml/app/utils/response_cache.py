@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional, Set, Tuple
+from .metrics import record_cache, record_upstream_error
+from .concurrency import run_blocking
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "memory" for an in-process LRU, "redis" to share entries between workers
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Entries are served as-is for this long, matching the bar store's refresh interval
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", os.getenv("BAR_REFRESH_SECONDS", "900")))
+# After the TTL, entries are still served for this long while being revalidated in the background
+RESPONSE_CACHE_MAX_STALE_SECONDS = int(os.getenv("RESPONSE_CACHE_MAX_STALE_SECONDS", "86400"))
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    stored_at: float
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers the given ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag[2:] == etag if tag.startswith('W/') else tag == etag for tag in tags)
+
+class MemoryBackend:
+    """Bounded in-process LRU of cached responses."""
+
+    def __init__(self, capacity: int = RESPONSE_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse, ttl: int):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+class RedisBackend:
+    """Cached responses in Redis (or anything speaking its protocol), shared by every worker."""
+
+    def __init__(self, url: str = RESPONSE_CACHE_REDIS_URL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raw = self.client.get(key)
+        if raw is None:
+            return None
+        stored_at, etag, body = raw.split(b'\n', 2)
+        return CachedResponse(body, etag.decode(), float(stored_at))
+
+    def set(self, key: str, entry: CachedResponse, ttl: int):
+        raw = f"{entry.stored_at}\n{entry.etag}\n".encode() + entry.body
+        self.client.set(key, raw, ex=ttl)
+
+def create_backend(name: str = RESPONSE_CACHE_BACKEND, capacity: int = RESPONSE_CACHE_SIZE):
+    if name == "redis":
+        try:
+            backend = RedisBackend()
+            backend.client.ping()
+            return backend
+        except Exception as e:
+            logger.warning(f"Redis response cache unavailable, using in-process cache: {str(e)}")
+    return MemoryBackend(capacity)
+
+class ResponseCache:
+    """
+    Serialized responses with ETags and stale-while-revalidate.
+
+    Callers put the data version in the key, so new market data naturally misses.
+    Within the TTL an entry is served as-is; after it, the entry is still served
+    for up to max_stale seconds while one background revalidation per key runs.
+    """
+
+    def __init__(self, backend=None, ttl: int = RESPONSE_CACHE_TTL_SECONDS, max_stale: int = RESPONSE_CACHE_MAX_STALE_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._revalidating: Set[str] = set()
+
+    def _backend(self):
+        if self.backend is None:
+            self.backend = create_backend()
+        return self.backend
+
+    def lookup(self, key: str) -> Tuple[Optional[CachedResponse], bool]:
+        """Return (entry, stale); entries past the stale window are treated as missing."""
+        try:
+            entry = self._backend().get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed for {key}: {str(e)}")
+            record_upstream_error("response_cache")
+            return None, False
+        if entry is None:
+            record_cache("response", "miss")
+            return None, False
+        age = time.time() - entry.stored_at
+        if age > self.ttl + self.max_stale:
+            record_cache("response", "miss")
+            return None, False
+        record_cache("response", "stale" if age > self.ttl else "hit")
+        return entry, age > self.ttl
+
+    def store(self, key: str, body: bytes) -> CachedResponse:
+        entry = CachedResponse(body, make_etag(body), time.time())
+        try:
+            self._backend().set(key, entry, self.ttl + self.max_stale)
+        except Exception as e:
+            logger.warning(f"Response cache write failed for {key}: {str(e)}")
+            record_upstream_error("response_cache")
+        return entry
+
+    def touch(self, key: str):
+        """Mark an entry fresh again after revalidation found no newer data."""
+        entry, _ = self.lookup(key)
+        if entry is not None:
+            self.store(key, entry.body)
+
+    async def _offload(self, func: Callable, *args):
+        # The in-process LRU is cheaper to call inline; Redis round trips go to the I/O executor
+        if isinstance(self.backend, MemoryBackend):
+            return func(*args)
+        return await run_blocking(func, *args)
+
+    async def lookup_async(self, key: str) -> Tuple[Optional[CachedResponse], bool]:
+        """lookup() for coroutines, without blocking the event loop on a remote backend."""
+        return await self._offload(self.lookup, key)
+
+    async def store_async(self, key: str, body: bytes) -> CachedResponse:
+        return await self._offload(self.store, key, body)
+
+    async def touch_async(self, key: str):
+        await self._offload(self.touch, key)
+
+    def revalidate(self, key: str, refresh: Callable[[], Awaitable[None]]):
+        """Run refresh() in the background unless a revalidation for this key is already running."""
+        if key in self._revalidating:
+            return
+        self._revalidating.add(key)
+
+        async def run():
+            try:
+                await refresh()
+            except Exception as e:
+                logger.warning(f"Revalidation of {key} failed: {str(e)}")
+            finally:
+                self._revalidating.discard(key)
+
+        asyncio.get_running_loop().create_task(run())
+
+response_cache = ResponseCache()
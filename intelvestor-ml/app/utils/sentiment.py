@@ -1,7 +1,174 @@
-from transformers import pipeline
 from newsapi import NewsApiClient
 import os
+import time
+import queue
+import hashlib
+import logging
+import threading
 import statistics
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from .news_cache import news_cache
+from .lexicon import get_lexicon_scorer
+from .metrics import record_cache, record_upstream_error, span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SENTIMENT_MODEL = "mrm8488/distilroberta-finetuned-financial-news-sentiment-analysis"
+# Largest number of texts scored in one forward pass
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))
+# How long the first text of a batch may wait for others to join it
+SENTIMENT_MAX_LATENCY_MS = float(os.getenv("SENTIMENT_MAX_LATENCY_MS", "20"))
+# Scored texts remembered by content hash
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "20000"))
+# Score clear-cut texts with the keyword lexicon and only send ambiguous ones to the model
+SENTIMENT_LEXICON_TRIAGE = os.getenv("SENTIMENT_LEXICON_TRIAGE", "1") == "1"
+
+class SentimentScorer:
+    """
+    Long-lived transformer sentiment scorer.
+
+    The pipeline is loaded once. Texts submitted from any thread or request are
+    queued and a single worker thread gathers them into micro-batches of up to
+    SENTIMENT_BATCH_SIZE, waiting at most SENTIMENT_MAX_LATENCY_MS for a batch to
+    fill, so concurrent callers share forward passes. Scores are cached by a hash
+    of the text and identical texts in flight are scored once.
+    """
+
+    def __init__(self, model: str = SENTIMENT_MODEL, batch_size: int = SENTIMENT_BATCH_SIZE,
+                 max_latency_ms: float = SENTIMENT_MAX_LATENCY_MS, cache_size: int = SENTIMENT_CACHE_SIZE):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.cache_size = cache_size
+        self._pipeline = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def is_warm(self) -> bool:
+        return self._pipeline is not None
+
+    def warm_up(self):
+        """Load the model (CPU) and start the batching worker; safe to call more than once."""
+        with self._lock:
+            if self._pipeline is None:
+                logger.info(f"Loading sentiment model {self.model}")
+                from transformers import pipeline
+                self._pipeline = pipeline("sentiment-analysis", model=self.model, device=-1)
+                self._pipeline(["warm-up"])
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="sentiment-batcher", daemon=True)
+                self._worker.start()
+
+    def shutdown(self):
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _score_batch(self, texts: List[str]) -> List[float]:
+        with span("sentiment_model"):
+            results = self._pipeline(texts, batch_size=self.batch_size, truncation=True)
+        return [res['score'] if res['label'] == 'positive' else -res['score'] for res in results]
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown requested; finish this batch first
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            keys = [key for key, _ in batch]
+            try:
+                scores = self._score_batch([text for _, text in batch])
+            except Exception as e:
+                logger.error(f"Sentiment batch of {len(batch)} failed: {str(e)}")
+                with self._lock:
+                    futures = [self._pending.pop(key, None) for key in keys]
+                for future in futures:
+                    if future is not None:
+                        future.set_exception(e)
+                continue
+            with self._lock:
+                futures = [self._pending.pop(key, None) for key in keys]
+                for key, score in zip(keys, scores):
+                    self._cache[key] = score
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for future, score in zip(futures, scores):
+                if future is not None:
+                    future.set_result(score)
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        """Queue texts for scoring; returns one future per text resolving to a score in [-1, 1]."""
+        if not self.is_warm or self._worker is None or not self._worker.is_alive():
+            self.warm_up()
+        futures = []
+        with self._lock:
+            for text in texts:
+                key = self._key(text)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    record_cache("sentiment", "hit")
+                    future = Future()
+                    future.set_result(self._cache[key])
+                elif key in self._pending:
+                    record_cache("sentiment", "coalesced")
+                    future = self._pending[key]
+                else:
+                    record_cache("sentiment", "miss")
+                    future = Future()
+                    self._pending[key] = future
+                    self._queue.put((key, text))
+                futures.append(future)
+        return futures
+
+    def score(self, texts: List[str]) -> List[float]:
+        """Blocking scoring of a list of texts through the shared batcher."""
+        return [future.result() for future in self.submit(texts)]
+
+sentiment_scorer = SentimentScorer()
+
+def fetch_articles(newsapi: NewsApiClient, symbol: str) -> List[Dict[str, str]]:
+    """Latest articles for a symbol, reduced to the fields the news cache keeps."""
+    try:
+        with span("newsapi"):
+            response = newsapi.get_everything(q=symbol, language='en', sort_by='publishedAt', page_size=10)
+    except Exception:
+        record_upstream_error("newsapi")
+        raise
+    return [
+        {"title": article['title'], "description": article.get('description') or ''}
+        for article in (response or {}).get('articles', [])
+    ]
 
 def compute_sentiment(symbol):
     api_key = os.getenv("NEWS_API_KEY")
@@ -16,8 +183,8 @@ def compute_sentiment(symbol):
     
     newsapi = NewsApiClient(api_key=api_key)
     try:
-        articles = newsapi.get_everything(q=symbol, language='en', sort_by='publishedAt', page_size=10)
-        if not articles or not articles.get('articles'):
+        articles = news_cache.get(symbol, lambda: fetch_articles(newsapi, symbol))
+        if not articles:
             return {
                 "score": 0, 
                 "headlines": ["No recent news found"],
@@ -25,13 +192,17 @@ def compute_sentiment(symbol):
                 "trends": []
             }
             
-        texts = [article['title'] + ' ' + (article['description'] or '') for article in articles['articles']]
-        sentiment_pipeline = pipeline("sentiment-analysis", model="mrm8488/distilroberta-finetuned-financial-news-sentiment-analysis")
-        results = sentiment_pipeline(texts)
-        scores = [res['score'] if res['label'] == 'positive' else -res['score'] for res in results]
+        texts = [article['title'] + ' ' + (article['description'] or '') for article in articles]
+        if SENTIMENT_LEXICON_TRIAGE:
+            scores = get_lexicon_scorer().triage(texts)
+            ambiguous = [text for text, score in zip(texts, scores) if score is None]
+            model_scores = iter(sentiment_scorer.score(ambiguous) if ambiguous else [])
+            scores = [score if score is not None else next(model_scores) for score in scores]
+        else:
+            scores = sentiment_scorer.score(texts)
         aggregated_score = statistics.mean(scores) if scores else 0
         
-        headlines = [article['title'] for article in articles['articles'][:5]]
+        headlines = [article['title'] for article in articles[:5]]
         
         return {
             "score": aggregated_score, 
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from .features import compute_indicator_panel
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process election, every process acts alone
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# tmpfs when available so the panel never touches disk; any directory shared by the workers works
+SHARED_PANEL_DIR = os.getenv(
+    "SHARED_PANEL_DIR",
+    "/dev/shm/intelvestor" if os.path.isdir("/dev/shm") else os.path.join("data", "panel")
+)
+# How often the writer republishes the panel; readers ignore panels older than twice this
+SHARED_PANEL_REFRESH_SECONDS = int(os.getenv("SHARED_PANEL_REFRESH_SECONDS", os.getenv("BAR_REFRESH_SECONDS", "900")))
+
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class SharedPanel:
+    """
+    Price and indicator panels shared by every worker process through memory-mapped files.
+
+    One process, elected through an exclusive lock file, publishes generations: each
+    field is a (symbols, dates) float64 .npy file in a fresh generation directory, and
+    a small manifest naming the current generation is swapped in atomically. Readers
+    map the files read-only, so all workers share the same physical pages, and pick
+    up a new generation as soon as the manifest changes.
+    """
+
+    def __init__(self, directory: str = SHARED_PANEL_DIR, max_age: int = 2 * SHARED_PANEL_REFRESH_SECONDS):
+        self.directory = directory
+        self.max_age = max_age
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self._manifest_mtime: Optional[float] = None
+        self._view: Optional[Dict] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, 'manifest.json')
+
+    def elect(self) -> bool:
+        """Try to become (or confirm being) the single writer; the lock is held until the process exits."""
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        handle = open(os.path.join(self.directory, 'writer.lock'), 'a+')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._lock_file = handle
+        logger.info(f"Process {os.getpid()} is the shared panel writer")
+        return True
+
+    @property
+    def is_writer(self) -> bool:
+        return self._lock_file is not None or fcntl is None
+
+    def publish(self, histories: Dict[str, Tuple[str, pd.DataFrame]]):
+        """
+        Write a new generation from symbol -> (ticker, history indexed by date) and make it
+        current. Histories are aligned on the union of their dates; missing bars are NaN.
+        """
+        if not self.elect():
+            raise RuntimeError("Only the elected writer process may publish the shared panel")
+        histories = {symbol.strip().upper(): value for symbol, value in histories.items() if value[1] is not None and not value[1].empty}
+        if not histories:
+            return
+        symbols = list(histories)
+        dates = pd.DatetimeIndex(sorted(set().union(*(hist.index for _, hist in histories.values()))))
+        T = len(dates)
+        fields = {field: np.full((len(symbols), T), np.nan) for field in PRICE_FIELDS}
+        # Indicators run over each symbol's own bars, right-aligned as in build_feature_panel,
+        # so a holiday on one exchange doesn't open a gap in another symbol's windows
+        close = np.full((T, len(symbols)), np.nan)
+        volume = np.full((T, len(symbols)), np.nan)
+        positions = {}
+        for j, symbol in enumerate(symbols):
+            hist = histories[symbol][1]
+            positions[j] = dates.get_indexer(hist.index)
+            for field in PRICE_FIELDS:
+                fields[field][j, positions[j]] = hist[field].to_numpy(dtype='float64')
+            close[T - len(hist):, j] = hist['Close'].to_numpy(dtype='float64')
+            volume[T - len(hist):, j] = hist['Volume'].to_numpy(dtype='float64')
+
+        for name, values in compute_indicator_panel(close, volume).items():
+            aligned = np.full((len(symbols), T), np.nan)
+            for j, pos in positions.items():
+                aligned[j, pos] = values[T - len(pos):, j]
+            fields[name] = aligned
+
+        generation = f"gen-{time.time_ns()}"
+        path = os.path.join(self.directory, generation)
+        os.makedirs(path)
+        for name, values in fields.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        manifest = {
+            "generation": generation,
+            "created_at": time.time(),
+            "symbols": symbols,
+            "tickers": [histories[symbol][0] for symbol in symbols],
+            "dates": [d.strftime('%Y-%m-%d') for d in dates],
+            "fields": list(fields)
+        }
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        self._cleanup(keep=generation)
+        logger.info(f"Published shared panel {generation}: {len(symbols)} symbols x {len(dates)} days")
+
+    def _cleanup(self, keep: str):
+        # Keep the previous generation too: readers may still be mapping it
+        generations = sorted(name for name in os.listdir(self.directory) if name.startswith('gen-'))
+        for name in generations[:-2]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _current(self) -> Optional[Dict]:
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._manifest_mtime:
+                try:
+                    with open(self.manifest_path) as f:
+                        manifest = json.load(f)
+                    path = os.path.join(self.directory, manifest['generation'])
+                    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in manifest['fields']}
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Failed to map shared panel: {str(e)}")
+                    return None
+                self._view = {
+                    "manifest": manifest,
+                    "arrays": arrays,
+                    "index": {symbol: j for j, symbol in enumerate(manifest['symbols'])},
+                    "dates": pd.DatetimeIndex(manifest['dates'])
+                }
+                self._manifest_mtime = mtime
+            return self._view
+
+    def history(self, symbol: str) -> Optional[Tuple[str, pd.DataFrame, Dict[str, np.ndarray]]]:
+        """
+        (ticker, OHLCV history indexed by date, indicator arrays aligned with it) for a symbol
+        in a fresh enough panel, or None. Each row is read from the shared mapping.
+        """
+        view = self._current()
+        if view is None or time.time() - view["manifest"]["created_at"] > self.max_age:
+            return None
+        j = view["index"].get(symbol.strip().upper())
+        if j is None:
+            return None
+        arrays = view["arrays"]
+        present = np.isfinite(arrays['Close'][j])
+        hist = pd.DataFrame({field: arrays[field][j][present] for field in PRICE_FIELDS}, index=view["dates"][present])
+        hist.index.name = 'Date'
+        indicators = {name: arrays[name][j][present] for name in view["manifest"]["fields"] if name not in PRICE_FIELDS}
+        return view["manifest"]["tickers"][j], hist, indicators
+
+    def status(self) -> Dict:
+        view = self._current()
+        manifest = view["manifest"] if view else {}
+        return {
+            "writer": self.is_writer,
+            "pid": os.getpid(),
+            "generation": manifest.get("generation"),
+            "symbols": len(manifest.get("symbols", [])),
+            "age_seconds": round(time.time() - manifest["created_at"], 1) if manifest else None
+        }
+
+shared_panel = SharedPanel()
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+from datetime import date, datetime
+from typing import Dict, List, Optional, Union
+
+# Simulated paths per forecast; 2000 x 90 steps is a few milliseconds
+MC_PATHS = int(os.getenv("MC_PATHS", "2000"))
+# Percentiles reported as the lower/upper confidence band
+BAND_PERCENTILES = (5.0, 95.0)
+
+def simulate_paths(start_price: float, drift: Union[float, np.ndarray], volatility: Union[float, np.ndarray], horizon: int,
+                   n_paths: int = MC_PATHS, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Simulate n_paths price paths of `horizon` daily steps in one shot.
+
+    drift and volatility are the mean and std of each step's simple return, either
+    scalars or arrays of length horizon. Returns an (n_paths, horizon) array.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    drift = np.broadcast_to(np.asarray(drift, dtype='float64'), (horizon,))
+    volatility = np.broadcast_to(np.asarray(volatility, dtype='float64'), (horizon,))
+    returns = rng.standard_normal((n_paths, horizon))
+    returns *= volatility
+    returns += drift
+    returns += 1.0
+    np.cumprod(returns, axis=1, out=returns)
+    returns *= start_price
+    return returns
+
+def forecast_dates(horizon: int, start: Optional[Union[date, datetime]] = None) -> List[str]:
+    """The `horizon` calendar days after start (today by default) as YYYY-MM-DD strings."""
+    start = np.datetime64((start or datetime.now()).strftime('%Y-%m-%d'))
+    return np.datetime_as_string(start + np.arange(1, horizon + 1), unit='D').tolist()
+
+def summarize_paths(paths: np.ndarray, dates: List[str]) -> List[Dict]:
+    """
+    Reduce simulated paths to one point per day: the median as "pred", the
+    BAND_PERCENTILES as "lower"/"upper", and "conf" as one minus the band width
+    relative to the median, so confidence falls as the paths spread out.
+    """
+    lower, median, upper = np.percentile(paths, [BAND_PERCENTILES[0], 50.0, BAND_PERCENTILES[1]], axis=0)
+    conf = np.clip(1.0 - (upper - lower) / (2.0 * median), 0.0, 1.0)
+    return [
+        {"date": d, "pred": p, "conf": c, "lower": lo, "upper": hi}
+        for d, p, c, lo, hi in zip(dates, median.round(2).tolist(), conf.round(2).tolist(), lower.round(2).tolist(), upper.round(2).tolist())
+    ]
+
+def trend_and_volatility(close: np.ndarray) -> Dict[str, float]:
+    """Recent trend (last 5 bars vs the 5 bars ending 15 bars earlier) and daily return volatility of a close series."""
+    close = np.asarray(close, dtype='float64')
+    earlier = close[-20:-15].mean()
+    returns = close[1:] / close[:-1] - 1
+    return {
+        "trend": float((close[-5:].mean() - earlier) / earlier),
+        "volatility": float(np.nanstd(returns, ddof=1))
+    }
+
+def realistic_paths(close: np.ndarray, horizon: int, n_paths: int = MC_PATHS, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Paths for the historical-pattern model: the recent trend decays by 5% a day while
+    the daily volatility grows by 10% of its starting value each day.
+    """
+    params = trend_and_volatility(close)
+    steps = np.arange(horizon)
+    drift = params["trend"] * 0.95 ** steps  # Trend decreases over time
+    volatility = params["volatility"] * (1 + steps * 0.1)  # Increasing uncertainty
+    return simulate_paths(float(close[-1]), drift, volatility, horizon, n_paths, rng)
@@ -0,0 +1,107 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+from .bar_store import has_bars
+from .metrics import record_cache, span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How long a resolved suffix and a known miss are trusted before probing again. Misses are kept
+# briefly: yfinance reports some outages as empty frames, indistinguishable from unknown tickers
+SYMBOL_TTL_SECONDS = int(os.getenv("SYMBOL_TTL_SECONDS", str(7 * 24 * 3600)))
+SYMBOL_NEGATIVE_TTL_SECONDS = int(os.getenv("SYMBOL_NEGATIVE_TTL_SECONDS", "300"))
+# Misses where some probe raised (timeouts, HTTP errors) are kept for even less
+SYMBOL_ERROR_TTL_SECONDS = int(os.getenv("SYMBOL_ERROR_TTL_SECONDS", "60"))
+
+# NSE first, then BSE, then the bare ticker for non-Indian listings
+SYMBOL_SUFFIXES = ['.NS', '.BO', '']
+
+T = TypeVar('T')
+
+class SymbolNotFoundError(ValueError):
+    """Raised when no exchange suffix yields data for a symbol."""
+
+class SymbolRegistry:
+    """Remembers which exchange suffix resolved for each symbol, including misses, with a TTL."""
+
+    def __init__(self, ttl: int = SYMBOL_TTL_SECONDS, negative_ttl: int = SYMBOL_NEGATIVE_TTL_SECONDS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(symbol: str) -> str:
+        return symbol.strip().upper()
+
+    def lookup(self, symbol: str) -> Tuple[bool, Optional[str]]:
+        """Return (known, resolved); resolved is None for a remembered miss."""
+        key = self.normalize(symbol)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            resolved, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return False, None
+            return True, resolved
+
+    def remember(self, symbol: str, resolved: Optional[str], ttl: Optional[int] = None):
+        if ttl is None:
+            ttl = self.ttl if resolved is not None else self.negative_ttl
+        with self._lock:
+            self._entries[self.normalize(symbol)] = (resolved, time.monotonic() + ttl)
+
+    def forget(self, symbol: str):
+        with self._lock:
+            self._entries.pop(self.normalize(symbol), None)
+
+    def candidates(self, symbol: str) -> List[str]:
+        """Tickers to probe, with ones already in the local bar store first."""
+        key = self.normalize(symbol)
+        if '.' in key or key.startswith('^'):
+            return [key]
+        formats = [f"{key}{suffix}" for suffix in SYMBOL_SUFFIXES]
+        return sorted(formats, key=lambda s: not has_bars(s))
+
+    def resolve(self, symbol: str, probe: Callable[[str], Optional[T]]) -> Tuple[str, T]:
+        """
+        Resolve a symbol to an exchange ticker using probe(ticker), which returns None on a miss
+        and raises on a transient error. Returns (ticker, probe result).
+        """
+        known, resolved = self.lookup(symbol)
+        record_cache("symbol", "hit" if known else "miss")
+        if known and resolved is None:
+            raise SymbolNotFoundError(f"No data for {symbol} on any exchange (cached miss)")
+        if known:
+            result = probe(resolved)
+            if result is not None:
+                return resolved, result
+            logger.info(f"Cached resolution {resolved} for {symbol} no longer returns data, probing again")
+            self.forget(symbol)
+
+        errors = []
+        with span("symbol_probe"):
+            for candidate in self.candidates(symbol):
+                try:
+                    result = probe(candidate)
+                except Exception as e:
+                    logger.debug(f"Probe failed for {candidate}: {str(e)}")
+                    errors.append(e)
+                    continue
+                if result is not None:
+                    self.remember(symbol, candidate)
+                    return candidate, result
+
+        # Every candidate failed: cache the miss so repeats fail fast, briefly when a probe raised
+        if not errors:
+            self.remember(symbol, None)
+            raise SymbolNotFoundError(f"No data for {symbol} on any exchange")
+        self.remember(symbol, None, SYMBOL_ERROR_TTL_SECONDS)
+        raise SymbolNotFoundError(f"Failed to resolve {symbol}: {str(errors[-1])}")
+
+symbol_registry = SymbolRegistry()
@@ -0,0 +1,56 @@
+import os
+import json
+import logging
+from typing import Dict, List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Optional JSON file overriding the defaults below:
+# {"popular": [...], "sectors": {"it": [...], ...}, "watchlist": [...]}
+WATCHLIST_PATH = os.getenv("WATCHLIST_PATH", "")
+
+DEFAULT_POPULAR = ['RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'AXISBANK']
+DEFAULT_SECTORS = {
+    "banking": ["HDFCBANK", "AXISBANK", "ICICIBANK", "SBIN"],
+    "it": ["TCS", "INFY", "WIPRO", "HCLTECH"],
+    "auto": ["MARUTI", "TATAMOTORS", "M&M", "BAJAJ-AUTO"],
+    "pharma": ["SUNPHARMA", "DRREDDY", "CIPLA", "DIVISLAB"]
+}
+# Sector shown for names not in the sector map
+DEFAULT_SECTOR_STOCKS = ["RELIANCE", "TCS", "HDFCBANK"]
+
+def _load() -> Dict:
+    config = {"popular": DEFAULT_POPULAR, "sectors": DEFAULT_SECTORS, "watchlist": []}
+    if WATCHLIST_PATH:
+        try:
+            with open(WATCHLIST_PATH) as f:
+                config.update(json.load(f))
+            logger.info(f"Loaded watchlists from {WATCHLIST_PATH}")
+        except Exception as e:
+            logger.warning(f"Failed to load watchlists from {WATCHLIST_PATH}, using defaults: {str(e)}")
+    return config
+
+_config = _load()
+
+def popular_symbols() -> List[str]:
+    """Symbols shown on the market overview."""
+    return list(_config["popular"])
+
+def sector_symbols(sector: str) -> List[str]:
+    return list(_config["sectors"].get(sector.lower(), DEFAULT_SECTOR_STOCKS))
+
+def symbol_sectors() -> Dict[str, str]:
+    """Sector of every symbol in the sector map; a symbol listed under several sectors keeps the first."""
+    sectors = {}
+    for sector, stocks in _config["sectors"].items():
+        for symbol in stocks:
+            sectors.setdefault(symbol.strip().upper(), sector.lower())
+    return sectors
+
+def warmup_symbols() -> List[str]:
+    """Every configured symbol, deduplicated in order: popular, watchlist, then sector members."""
+    symbols = list(_config["popular"]) + list(_config["watchlist"])
+    for stocks in _config["sectors"].values():
+        symbols.extend(stocks)
+    return list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
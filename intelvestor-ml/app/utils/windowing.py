@@ -0,0 +1,74 @@
+import os
+import math
+from typing import Iterator, List, Sequence, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Rows of history each LSTM sample sees
+LSTM_LOOKBACK = int(os.getenv("LSTM_LOOKBACK", "30"))
+LSTM_BATCH_SIZE = int(os.getenv("LSTM_BATCH_SIZE", "32"))
+# "direct" predicts every forecast day in one pass, "recursive" predicts one day and feeds it back
+LSTM_FORECAST_MODE = os.getenv("LSTM_FORECAST_MODE", "direct")
+
+def window_view(X: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    All windows of `lookback` consecutive rows of X as a read-only strided view shaped
+    (rows - lookback + 1, lookback, features); window i covers rows i..i+lookback-1.
+    Nothing is copied, however long the lookback.
+    """
+    X = np.asarray(X)
+    return sliding_window_view(X, (lookback, X.shape[1]))[:, 0]
+
+def segment_starts(lengths: Sequence[int], lookback: int) -> np.ndarray:
+    """
+    Start rows of the windows that lie entirely inside one segment when segments of the
+    given lengths (e.g. one per symbol) are stacked back to back in a single array.
+    """
+    starts, offset = [], 0
+    for n in lengths:
+        if n >= lookback:
+            starts.append(offset + np.arange(n - lookback + 1))
+        offset += n
+    return np.concatenate(starts) if starts else np.empty(0, dtype='int64')
+
+def forward_ratios(close: np.ndarray, steps: int) -> np.ndarray:
+    """(rows, steps) relative change from each row's close to the close 1..steps rows later; NaN past the end."""
+    close = np.asarray(close, dtype='float64')
+    out = np.full((len(close), steps), np.nan)
+    for k in range(1, min(steps, len(close) - 1) + 1):
+        out[:-k, k - 1] = close[k:] / close[:-k] - 1
+    return out
+
+def steps_per_epoch(n_windows: int, batch_size: int = LSTM_BATCH_SIZE) -> int:
+    return max(1, math.ceil(n_windows / batch_size))
+
+def window_batches(X: np.ndarray, targets: np.ndarray, starts: np.ndarray, lookback: int, batch_size: int = LSTM_BATCH_SIZE,
+                   extras: List[np.ndarray] = (), shuffle: bool = True, seed: int = 42) -> Iterator[Tuple]:
+    """
+    Endless (inputs, targets) batches for Keras fit(), reshuffled every epoch.
+
+    Windows are gathered from window_view(X), so only one batch of windows exists as a
+    copy at a time instead of all N x lookback rows. The target of the window starting
+    at s is targets[s + lookback - 1], the row it ends on; extras are other per-row
+    model inputs (e.g. symbol ids) taken at the same row.
+    """
+    starts = np.asarray(starts)
+    if not len(starts):
+        raise ValueError(f"No complete {lookback}-row windows to train on")
+    view = window_view(X, lookback)
+    ends = starts + lookback - 1
+    rng = np.random.default_rng(seed)
+    while True:
+        order = rng.permutation(len(starts)) if shuffle else np.arange(len(starts))
+        for i in range(0, len(order), batch_size):
+            batch = order[i:i + batch_size]
+            windows = view[starts[batch]]
+            inputs = tuple([windows] + [extra[ends[batch], None] for extra in extras]) if len(extras) else windows
+            yield inputs, targets[ends[batch]]
+
+def latest_window(X: np.ndarray, lookback: int) -> np.ndarray:
+    """The last `lookback` rows as a batch of one window, repeating the first row if history is shorter."""
+    X = np.asarray(X)[-lookback:]
+    if len(X) < lookback:
+        X = np.pad(X, ((lookback - len(X), 0), (0, 0)), mode='edge')
+    return X[None]